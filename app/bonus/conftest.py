@@ -0,0 +1,7 @@
+import pytest
+import main
+
+
+@pytest.fixture(scope="session")
+def service():
+    return main
@@ -2,16 +2,21 @@ import inspect
 import sys
 import uuid
 from fastapi import FastAPI, HTTPException, Depends, Path
+from fastapi.responses import StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic import TypeAdapter
 from sqlalchemy import (
     TIMESTAMP,
     CheckConstraint,
     ForeignKey,
+    Index,
     StaticPool,
     create_engine,
     Column,
     Integer,
     String,
     UUID,
+    select,
 )
 from sqlalchemy.orm import sessionmaker, Session, declarative_base
 from sqlalchemy import Column, Integer, String
@@ -92,6 +97,11 @@ class PrivilegeHistoryDb(Base):
             "operation_type IN ('FILL_IN_BALANCE', 'DEBIT_THE_ACCOUNT')",
             name="privilege_operation_type_check",
         ),
+        Index(
+            "ix_privilege_history_privilege_id_ticket_uid",
+            "privilege_id",
+            "ticket_uid",
+        ),
     )
 
     privilege = relationship("PrivilegeDb", back_populates="history")
@@ -101,6 +111,7 @@ class PrivilegeHistoryDb(Base):
 # FASTAPI APPLICATION
 # ==============================================
 app = FastAPI(title="Privilege Service", version="1.0")
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
 
 
 # ==============================================
@@ -114,6 +125,29 @@ def get_db():
         db.close()
 
 
+# ==============================================
+# HELPER FUNCTIONS
+# ==============================================
+_HISTORY_LIST = TypeAdapter(List[PrivilegeHistory])
+
+
+def stream_history_json(history_rows):
+    # Emit a JSON array chunk by chunk, one chunk per fetched partition,
+    # so the full history never has to be held in memory
+    yield b"["
+    first_chunk = True
+    for partition in history_rows.partitions():
+        if not first_chunk:
+            yield b","
+        # The chunk is serialized as one array, only its items are emitted
+        chunk_json = _HISTORY_LIST.dump_json(
+            _HISTORY_LIST.validate_python(partition, from_attributes=True)
+        )
+        yield chunk_json[1:-1]
+        first_chunk = False
+    yield b"]"
+
+
 # ==============================================
 # API ENDPOINTS
 # ==============================================
@@ -137,7 +171,11 @@ def get_privilege_by_username(
     return privilege
 
 
-@app.get("/privilege/{username}/history", response_model=List[PrivilegeHistory])
+@app.get(
+    "/privilege/{username}/history",
+    response_model=None,
+    responses={200: {"model": List[PrivilegeHistory]}},
+)
 def get_privilege_history_by_username(
         username: str,
         db: Session = Depends(get_db)
@@ -154,15 +192,20 @@ def get_privilege_history_by_username(
             detail="Privilege not found for this user"
         )
 
-    history = (
-        db.query(PrivilegeHistoryDb)
-        .filter(PrivilegeHistoryDb.privilege_id == privilege.id)
+    history_rows = db.execute(
+        select(PrivilegeHistoryDb)
+        .where(PrivilegeHistoryDb.privilege_id == privilege.id)
         .order_by(PrivilegeHistoryDb.datetime.desc())
-        .all()
+        .execution_options(yield_per=200)
+    ).scalars()
+
+    # The rows are read from the db session while the body is sent; FastAPI
+    # closes yield dependencies only after that since 0.118 (requirements.txt)
+    return StreamingResponse(
+        stream_history_json(history_rows),
+        media_type="application/json",
     )
 
-    return history
-
 
 @app.get(
     "/privilege/{username}/history/{ticket_uid}",
@@ -203,7 +246,11 @@ def get_specific_history_entry(
     return history_entry
 
 
-@app.post("/privilege/{username}/history", status_code=201)
+@app.post(
+    "/privilege/{username}/history",
+    status_code=201,
+    response_model=Privilege,
+)
 def add_transaction(
         username: str,
         data: AddTransactionRequest,
@@ -243,6 +290,9 @@ def add_transaction(
     db.commit()
     db.refresh(priv)
 
+    # The caller gets the new balance without reading it back separately
+    return priv
+
 
 @app.delete("/privilege/{username}/history/{ticket_uid}", status_code=204)
 def rollback_transaction(
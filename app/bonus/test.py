@@ -1,78 +1,35 @@
 from datetime import datetime
 from uuid import uuid4
 import pytest
-from fastapi.testclient import TestClient
-from sqlalchemy.orm import sessionmaker
-import os
+from main import PrivilegeDb, PrivilegeHistoryDb
 
 # ==============================================
-# TEST CONFIGURATION
-# ==============================================
-os.environ["TESTING"] = "True"
-
-from main import app, get_db, Base, PrivilegeDb, PrivilegeHistoryDb, engine
-
-# ==============================================
-# DATABASE SETUP FOR TESTING
+# TEST FIXTURES
 # ==============================================
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-
-def override_get_db():
-    try:
-        db_session = TestingSessionLocal()
-        yield db_session
-    finally:
-        db_session.close()
+# Database fixtures and the client come from testing/db_plugin.py,
+# loaded by the root conftest.py
 
 
-app.dependency_overrides[get_db] = override_get_db
-
-
-# ==============================================
-# TEST FIXTURES
-# ==============================================
-@pytest.fixture(scope="function")
-def db_session():
-    """
-    Creates a fresh database session for test execution
-    """
-    Base.metadata.create_all(bind=engine)
-
-    test_session = TestingSessionLocal()
-    try:
-        yield test_session
-    finally:
-        test_session.close()
-        Base.metadata.drop_all(bind=engine)
-
-
-@pytest.fixture
-def client():
-    Base.metadata.create_all(bind=engine)
-    yield TestClient(app)
-    Base.metadata.drop_all(bind=engine)
-
-
-@pytest.fixture
-def sample_loyalty_account(db_session):
+@pytest.fixture(scope="session")
+def sample_loyalty_account(session_factory):
+    db_session = session_factory(expire_on_commit=False)
     loyalty_account = PrivilegeDb(
         username="test_client",
         status="GOLD",
         balance=500
     )
-    db_session.add(loyalty_account)
-    db_session.commit()
-
     transaction_record = PrivilegeHistoryDb(
-        privilege_id=loyalty_account.id,
+        privilege=loyalty_account,
         ticket_uid=uuid4(),
         datetime=datetime.now(),
         balance_diff=+200,
         operation_type="FILL_IN_BALANCE",
     )
-    db_session.add(transaction_record)
+
+    # Both rows go out in a single flush; the FK is filled in by the relationship
+    db_session.add_all([loyalty_account, transaction_record])
     db_session.commit()
+    db_session.close()
 
     return loyalty_account, transaction_record
 
@@ -161,6 +118,7 @@ def test_create_new_transaction(client, sample_loyalty_account):
     )
 
     assert response.status_code == 201
+    assert response.json()["balance"] == 350
 
     # Verify account balance was updated
     account_check = client.get(f"/privilege/{account_data.username}")
@@ -171,6 +129,31 @@ def test_create_new_transaction(client, sample_loyalty_account):
     assert updated_account["balance"] == 350  # 500 - 150
 
 
+def test_create_transaction_returns_updated_privilege(client, sample_loyalty_account):
+    account_data, _ = sample_loyalty_account
+
+    response = client.post(
+        f"/privilege/{account_data.username}/history",
+        json={
+            "ticket_uid": str(uuid4()),
+            "balance_diff": 150,
+            "operation_type": "FILL_IN_BALANCE",
+            "privilege_id": account_data.id,
+            "datetime": datetime.now().isoformat(),
+        },
+    )
+
+    assert response.status_code == 201
+    # The gateway uses this body instead of reading the privilege again
+    assert response.json() == {
+        "id": account_data.id,
+        "username": account_data.username,
+        "status": "GOLD",
+        "balance": 650,
+    }
+    assert client.get(f"/privilege/{account_data.username}").json() == response.json()
+
+
 def test_create_transaction_invalid_operation(client, sample_loyalty_account):
     account_data, _ = sample_loyalty_account
 
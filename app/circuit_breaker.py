@@ -1,5 +1,6 @@
+import asyncio
 import time
-from typing import Callable, Any, Optional
+from typing import Callable, Any, Awaitable, Optional
 
 
 class CircuitOpenException(Exception):
@@ -11,46 +12,140 @@ class CircuitBreaker:
     def __init__(
         self,
         service,
-        failure_threshold: int = 1,
-        recovery_timeout: int = 1,
+        failure_threshold: int = 5,
+        recovery_timeout: int = 10,
+        half_open_max_calls: int = 1,
+        slow_call_duration: Optional[float] = None,
+        latency_smoothing: float = 0.2,
+        is_failure: Callable[[Exception], bool] = lambda exc: True,
     ):
         self.failure_threshold = failure_threshold
         self.recovery_timeout = recovery_timeout
+        # Trial calls let through at once while half-open
+        self.half_open_max_calls = half_open_max_calls
+        # Calls keep counting as failures while the average latency is above this
+        self.slow_call_duration = slow_call_duration
+        self.latency_smoothing = latency_smoothing
+        # Errors it rejects (e.g. 4xx responses) are re-raised as is
+        self.is_failure = is_failure
 
+        self.service = service
+        self.reset()
+
+    def reset(self):
+        # Back to a closed breaker with no history
         self.fail_count = 0
         self.state = "closed"  # closed | open | half-open
         self.open_since = None
-        self.service = service
+        self.half_open_calls = 0
+        # Set whenever a half-open trial call finishes
+        self._probe_finished = asyncio.Event()
+        self.latency_ema = None
 
     def call(self, func: Callable, *args, **kwargs) -> Any:
+        is_probe = self._before_call()
+
+        started_at = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as exc:
+            self._on_error(exc)
+        finally:
+            self._after_call(is_probe)
+
+        self._on_success(time.monotonic() - started_at)
+        return result
+
+    async def call_async(self, func: Callable[..., Awaitable], *args, **kwargs) -> Any:
+        await self._wait_for_probe()
+        is_probe = self._before_call()
+
+        started_at = time.monotonic()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as exc:
+            self._on_error(exc)
+        finally:
+            self._after_call(is_probe)
+
+        self._on_success(time.monotonic() - started_at)
+        return result
+
+    def retry_after(self) -> float:
+        # Seconds until an open breaker lets a trial call through
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self.open_since + self.recovery_timeout - time.time())
+
+    async def _wait_for_probe(self):
+        # Concurrent callers (e.g. a gathered fan-out) wait for the outcome
+        # of the trial calls instead of being rejected while half-open
+        while self.state == "half-open" and self.half_open_calls >= self.half_open_max_calls:
+            await self._probe_finished.wait()
+
+    def _before_call(self) -> bool:
         now = time.time()
 
         # ----- OPEN -----
         if self.state == "open":
             if now - self.open_since >= self.recovery_timeout:
                 self.state = "half-open"
+                self.half_open_calls = 0
             else:
                 raise CircuitOpenException(self.service)
 
-        try:
-            result = func(*args, **kwargs)
-        except Exception:
-            self.fail_count += 1
-
-            if self.state == "half-open":
-                self.state = "open"
-                self.open_since = time.time()
+        # ----- HALF-OPEN -----
+        if self.state == "half-open":
+            if self.half_open_calls >= self.half_open_max_calls:
                 raise CircuitOpenException(self.service)
+            self.half_open_calls += 1
+            return True
 
-            if self.fail_count >= self.failure_threshold:
-                self.state = "open"
-                self.open_since = time.time()
-                raise CircuitOpenException(self.service)
+        return False
+
+    def _after_call(self, is_probe: bool):
+        if not is_probe:
+            return
+
+        self.half_open_calls = max(0, self.half_open_calls - 1)
+        # Waiters resume after the outcome has been recorded, the new event
+        # is for callers that still find the trial calls taken
+        probe_finished, self._probe_finished = self._probe_finished, asyncio.Event()
+        probe_finished.set()
+
+    def _on_error(self, exc: Exception):
+        if not self.is_failure(exc):
+            # The service answered, the error belongs to the caller
+            self._on_success(None)
+            raise exc
+
+        self._on_failure()
+        # Re-raise original exception (timeout, 500, etc.) as unavailability
+        raise CircuitOpenException(self.service) from exc
+
+    def _on_failure(self):
+        self.fail_count += 1
+
+        if self.state == "half-open" or self.fail_count >= self.failure_threshold:
+            self.state = "open"
+            self.open_since = time.time()
+            # Latency from before the outage says nothing about the recovered service
+            self.latency_ema = None
+
+    def _on_success(self, duration: Optional[float]):
+        # A trial call that succeeded closes the breaker however long it took
+        track_latency = self.state != "half-open" and duration is not None
+        if track_latency and self.slow_call_duration is not None:
+            if self.latency_ema is None:
+                self.latency_ema = duration
+            else:
+                self.latency_ema += self.latency_smoothing * (duration - self.latency_ema)
 
-            # Re-raise original exception (timeout, 500, etc.)
-            raise CircuitOpenException(self.service)
+            if self.latency_ema > self.slow_call_duration:
+                # The service responds, but too slowly to be worth waiting for
+                self._on_failure()
+                return
 
         # ----- SUCCESS -----
         self.fail_count = 0
         self.state = "closed"
-        return result
\ No newline at end of file
@@ -1,10 +1,80 @@
+import os
+import threading
+import time
 import uuid
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import AliasChoices, BaseModel, Field, ConfigDict
+from typing import Any, List, Optional
 from datetime import datetime
 from enum import Enum
 
 
+# ==============================================
+# RESPONSE CLASSES
+# ==============================================
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson, for content built by hand.
+    Routes with a response model are already serialized by Pydantic.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+# The services gzip their list responses, smaller bodies are not worth it
+GZIP_MINIMUM_SIZE = 512
+
+
+# ==============================================
+# IDENTIFIERS
+# ==============================================
+
+_uuid7_lock = threading.Lock()
+_uuid7_last_ms = 0
+_uuid7_counter = 0
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Time-ordered UUID (RFC 9562 version 7): 48-bit unix milliseconds,
+    a 12-bit counter keeping ids of the same millisecond monotonic
+    and 62 random bits.
+    """
+    global _uuid7_last_ms, _uuid7_counter
+
+    with _uuid7_lock:
+        unix_ms = time.time_ns() // 1_000_000
+        if unix_ms > _uuid7_last_ms:
+            _uuid7_last_ms = unix_ms
+            _uuid7_counter = 0
+        else:
+            _uuid7_counter += 1
+            if _uuid7_counter > 0xFFF:
+                # Counter exhausted, borrow the next millisecond
+                _uuid7_last_ms += 1
+                _uuid7_counter = 0
+        unix_ms, counter = _uuid7_last_ms, _uuid7_counter
+
+    random_bits = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (
+        (unix_ms & ((1 << 48) - 1)) << 80
+        | 0x7 << 76
+        | counter << 64
+        | 0b10 << 62
+        | random_bits
+    )
+    return uuid.UUID(int=value)
+
+
+def uuid7_datetime(value: uuid.UUID) -> datetime:
+    # The UTC millisecond encoded in a version 7 UUID as naive local time,
+    # like datetime.now(); the services store it in TIMESTAMP columns
+    return datetime.fromtimestamp((value.int >> 80) / 1000)
+
+
 # ==============================================
 # DATABASE ENTITY MODELS
 # ==============================================
@@ -94,11 +164,18 @@ class FlightResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class FlightCursor(BaseModel):
+    afterId: int
+    afterDt: datetime
+
+
 class PaginationResponse(BaseModel):
-    page: int
+    # Not set for pages read after a cursor, their position is unknown
+    page: Optional[int] = None
     pageSize: int
     totalElements: int
     items: List[FlightResponse]
+    nextCursor: Optional[FlightCursor] = None
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -157,10 +234,13 @@ class PrivilegeShortInfo(BaseModel):
 
 
 class BalanceHistory(BaseModel):
-    date: datetime
-    ticketUid: uuid.UUID
-    balanceDiff: int
-    operationType: OperationType
+    # Also accepts the field names of the bonus service history entries
+    date: datetime = Field(validation_alias=AliasChoices("date", "datetime"))
+    ticketUid: uuid.UUID = Field(validation_alias=AliasChoices("ticketUid", "ticket_uid"))
+    balanceDiff: int = Field(validation_alias=AliasChoices("balanceDiff", "balance_diff"))
+    operationType: OperationType = Field(
+        validation_alias=AliasChoices("operationType", "operation_type")
+    )
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -1,11 +1,15 @@
 import inspect
 import sys
-from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi import FastAPI, HTTPException, Depends, Query, Body
+from fastapi.middleware.gzip import GZipMiddleware
 from sqlalchemy import create_engine, Column, Integer, String
 from sqlalchemy.orm import sessionmaker, Session, declarative_base
 from sqlalchemy import Column, Integer, String, ForeignKey, TIMESTAMP, StaticPool
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy import Index, func, select, text, tuple_
+from sqlalchemy.orm import relationship, declarative_base, joinedload
+from cachetools import TTLCache, cached
 from datetime import datetime
+from threading import Lock
 import os
 
 
@@ -49,6 +53,7 @@ else:
 # FASTAPI APPLICATION
 # ==============================================
 app = FastAPI(title="Flight API")
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
 
 
 # ==============================================
@@ -90,12 +95,17 @@ class FlightDb(Base):
     __tablename__ = "flight"
 
     id = Column(Integer, primary_key=True)
-    flight_number = Column(String(20), nullable=False)
+    flight_number = Column(String(20), nullable=False, unique=True, index=True)
     datetime = Column(TIMESTAMP(timezone=True))
     from_airport_id = Column(Integer, ForeignKey("airport.id"))
     to_airport_id = Column(Integer, ForeignKey("airport.id"))
     price = Column(Integer, nullable=False)
 
+    # Keyset pagination walks flights in (datetime, id) order
+    __table_args__ = (
+        Index("ix_flight_dt_id", "datetime", "id"),
+    )
+
     # Flight relationships
     from_airport = relationship(
         "AirportDb",
@@ -112,15 +122,38 @@ class FlightDb(Base):
 # ==============================================
 # HELPER FUNCTIONS
 # ==============================================
+# Above this many rows the planner's estimate is reported instead of an exact count
+EXACT_COUNT_LIMIT = 10_000
+
+
+@cached(TTLCache(maxsize=1, ttl=30), key=lambda db: FlightDb.__tablename__, lock=Lock())
+def estimate_flight_count(db: Session) -> int | None:
+    """
+    Row estimate for the flight table kept by Postgres statistics,
+    None when the backend has no such estimate
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+
+    estimate = db.execute(
+        text("SELECT reltuples::BIGINT FROM pg_class WHERE relname = :table_name"),
+        {"table_name": FlightDb.__tablename__},
+    ).scalar()
+
+    # -1 means the table has never been analyzed
+    return estimate if estimate is not None and estimate >= 0 else None
+
+
 def flight_to_response(flight_record: FlightDb) -> FlightResponse:
     departure_airport = f"{flight_record.from_airport.city} {flight_record.from_airport.name}"
     arrival_airport = f"{flight_record.to_airport.city} {flight_record.to_airport.name}"
 
-    return FlightResponse(
+    # Row values are already typed by the ORM, no need to validate them again
+    return FlightResponse.model_construct(
         flightNumber=flight_record.flight_number,
         fromAirport=departure_airport,
         toAirport=arrival_airport,
-        date=flight_record.datetime.isoformat(),
+        date=flight_record.datetime,
         price=flight_record.price,
     )
 
@@ -128,39 +161,141 @@ def flight_to_response(flight_record: FlightDb) -> FlightResponse:
 # ==============================================
 # API ENDPOINTS
 # ==============================================
-@app.get("/flights", response_model=PaginationResponse)
+@app.get(
+    "/flights",
+    response_model=None,
+    responses={200: {"model": PaginationResponse}},
+)
 def get_all_flights(
-    page: int = Query(1, ge=1, description="Page number"),
+    page: int = Query(1, ge=1, description="Page number, ignored after a cursor"),
     page_size: int = Query(
         10, ge=1, le=100, description="Items per page"
     ),
+    after_id: int | None = Query(None, description="Id of the last flight seen"),
+    after_dt: datetime | None = Query(None, description="Date of the last flight seen"),
     db: Session = Depends(get_db),
 ):
     # Calculate pagination offset
     offset_value = (page - 1) * page_size
+    use_cursor = after_id is not None and after_dt is not None
+    if not use_cursor and (after_id is not None or after_dt is not None):
+        # Falling back to the first page would send a client round in circles
+        raise HTTPException(
+            status_code=422,
+            detail="after_id and after_dt must be given together"
+        )
+
+    # Airports are joined in so that building the response issues no extra queries
+    page_query = (
+        select(FlightDb)
+        .options(
+            joinedload(FlightDb.from_airport),
+            joinedload(FlightDb.to_airport),
+        )
+        .order_by(FlightDb.datetime, FlightDb.id)
+        # One extra row tells whether another page follows
+        .limit(page_size + 1)
+    )
+
+    if use_cursor:
+        # Seek straight past the last seen flight instead of skipping rows
+        page_query = page_query.where(
+            tuple_(FlightDb.datetime, FlightDb.id) > (after_dt, after_id)
+        )
+    else:
+        page_query = page_query.offset(offset_value)
 
-    # Get total count and paginated results
-    total_count = db.query(FlightDb).count()
-    flight_records = db.query(FlightDb).offset(offset_value).limit(page_size).all()
+    # Exact counting scans the whole table, for large tables the estimate is used
+    estimated_count = estimate_flight_count(db)
+    if estimated_count is not None and estimated_count >= EXACT_COUNT_LIMIT:
+        flight_records = db.scalars(page_query).unique().all()
+        total_count = estimated_count
+    elif use_cursor:
+        # Rows before the cursor are not part of the page query, count them separately
+        flight_records = db.scalars(page_query).unique().all()
+        total_count = db.query(FlightDb).count()
+    else:
+        # Get paginated results together with the exact total count in one query
+        page_rows = db.execute(
+            page_query.add_columns(func.count().over().label("total"))
+        ).unique().all()
+        flight_records = [flight for flight, _ in page_rows]
+
+        if page_rows:
+            total_count = page_rows[0].total
+        elif offset_value:
+            # Page is past the end, so there was no row to carry the total
+            total_count = db.query(FlightDb).count()
+        else:
+            total_count = 0
+
+    has_next_page = len(flight_records) > page_size
+    flight_records = flight_records[:page_size]
 
     # Convert to response format
     response_items = [flight_to_response(flight) for flight in flight_records]
 
-    return PaginationResponse(
-        page=page,
+    next_cursor = None
+    if has_next_page:
+        last_flight = flight_records[-1]
+        next_cursor = FlightCursor.model_construct(
+            afterId=last_flight.id,
+            afterDt=last_flight.datetime,
+        )
+
+    pagination = PaginationResponse.model_construct(
+        page=None if use_cursor else page,
         pageSize=page_size,
         totalElements=total_count,
         items=response_items,
+        nextCursor=next_cursor,
     )
+    return ORJSONResponse(content=pagination.model_dump())
 
 
-@app.get("/flights/{flight_number}", response_model=FlightResponse)
+@app.post(
+    "/flights/batch",
+    response_model=None,
+    responses={200: {"model": List[FlightResponse]}},
+)
+def get_flights_by_numbers(
+    flight_numbers: List[str] = Body(..., description="Flight numbers to look up"),
+    db: Session = Depends(get_db),
+):
+    if not flight_numbers:
+        return ORJSONResponse(content=[])
+
+    flight_records = (
+        db.query(FlightDb)
+        .options(
+            joinedload(FlightDb.from_airport),
+            joinedload(FlightDb.to_airport),
+        )
+        .filter(FlightDb.flight_number.in_(set(flight_numbers)))
+        .all()
+    )
+
+    # Unknown flight numbers are simply absent from the result
+    return ORJSONResponse(
+        content=[flight_to_response(flight).model_dump() for flight in flight_records]
+    )
+
+
+@app.get(
+    "/flights/{flight_number}",
+    response_model=None,
+    responses={200: {"model": FlightResponse}},
+)
 def get_flight_by_number(
     flight_number: str,
     db: Session = Depends(get_db)
 ):
     flight_record = (
         db.query(FlightDb)
+        .options(
+            joinedload(FlightDb.from_airport),
+            joinedload(FlightDb.to_airport),
+        )
         .filter(FlightDb.flight_number == flight_number)
         .first()
     )
@@ -171,7 +306,7 @@ def get_flight_by_number(
             detail="Flight not found"
         )
 
-    return flight_to_response(flight_record)
+    return ORJSONResponse(content=flight_to_response(flight_record).model_dump())
 
 
 @app.get("/manage/health", status_code=201)
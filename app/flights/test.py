@@ -1,60 +1,17 @@
 from datetime import datetime
 import pytest
-from fastapi.testclient import TestClient
-from sqlalchemy.orm import sessionmaker
-import os
+from main import FlightDb, AirportDb
 
 # ==============================================
-# TEST CONFIGURATION
-# ==============================================
-os.environ["TESTING"] = "True"
-
-from main import app, get_db, Base, FlightDb, AirportDb, engine
-
-# ==============================================
-# DATABASE SETUP FOR TESTING
+# TEST FIXTURES
 # ==============================================
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
+# Database fixtures and the client come from testing/db_plugin.py,
+# loaded by the root conftest.py
 
-def override_get_db():
-    try:
-        db_session = TestingSessionLocal()
-        yield db_session
-    finally:
-        db_session.close()
 
-
-app.dependency_overrides[get_db] = override_get_db
-
-
-# ==============================================
-# TEST FIXTURES
-# ==============================================
-@pytest.fixture(scope="function")
-def db_session():
-    """
-    Creates a fresh database session for test execution
-    """
-    Base.metadata.create_all(bind=engine)
-
-    test_session = TestingSessionLocal()
-    try:
-        yield test_session
-    finally:
-        test_session.close()
-        Base.metadata.drop_all(bind=engine)
-
-
-@pytest.fixture
-def client():
-    Base.metadata.create_all(bind=engine)
-    yield TestClient(app)
-    Base.metadata.drop_all(bind=engine)
-
-
-@pytest.fixture
-def sample_data(db_session):
+@pytest.fixture(scope="session")
+def sample_data(session_factory):
+    db_session = session_factory(expire_on_commit=False)
     # Create test airports
     moscow_airport = AirportDb(
         name="SVO Airport",
@@ -67,21 +24,19 @@ def sample_data(db_session):
         country="Russia"
     )
 
-    db_session.add(moscow_airport)
-    db_session.add(spb_airport)
-    db_session.commit()
-
     # Create test flight
     test_flight = FlightDb(
         flight_number="SU100",
         datetime=datetime(2024, 1, 15, 14, 30, 0),
-        from_airport_id=moscow_airport.id,
-        to_airport_id=spb_airport.id,
+        from_airport=moscow_airport,
+        to_airport=spb_airport,
         price=7500,
     )
 
-    db_session.add(test_flight)
+    # All rows go out in a single flush; FKs are filled in by the relationships
+    db_session.add_all([moscow_airport, spb_airport, test_flight])
     db_session.commit()
+    db_session.close()
 
     return moscow_airport, spb_airport, test_flight
 
@@ -108,7 +63,7 @@ def test_get_all_flights_list(client, sample_data):
     assert flight_item["price"] == 7500
 
 
-def test_get_all_flights_pagination(client, sample_data):
+def test_get_all_flights_pagination(client, sample_data, db_session):
     # Add more flights to test pagination
     moscow_airport, spb_airport, existing_flight = sample_data
 
@@ -121,7 +76,6 @@ def test_get_all_flights_pagination(client, sample_data):
         price=8000,
     )
 
-    db_session = next(override_get_db())
     db_session.add(second_flight)
     db_session.commit()
 
@@ -137,6 +91,59 @@ def test_get_all_flights_pagination(client, sample_data):
     assert response_data["pageSize"] == 1
 
 
+def test_get_all_flights_cursor_pagination(client, sample_data, db_session):
+    moscow_airport, spb_airport, existing_flight = sample_data
+
+    db_session.add(
+        FlightDb(
+            flight_number="SU200",
+            datetime=datetime(2024, 1, 16, 10, 0, 0),
+            from_airport_id=moscow_airport.id,
+            to_airport_id=spb_airport.id,
+            price=8000,
+        )
+    )
+    db_session.commit()
+
+    first_page = client.get("/flights?page_size=1").json()
+
+    assert first_page["items"][0]["flightNumber"] == "SU100"
+    assert first_page["nextCursor"]["afterId"] == existing_flight.id
+
+    cursor = first_page["nextCursor"]
+    second_page = client.get(
+        "/flights",
+        params={
+            "page_size": 1,
+            "after_id": cursor["afterId"],
+            "after_dt": cursor["afterDt"],
+        },
+    ).json()
+
+    assert second_page["totalElements"] == 2
+    assert second_page["page"] is None
+    assert [item["flightNumber"] for item in second_page["items"]] == ["SU200"]
+    # The last page is full, but nothing follows it
+    assert second_page["nextCursor"] is None
+
+
+@pytest.mark.parametrize("cursor_params", [{"after_id": 1}, {"after_dt": "2024-01-15T10:00:00"}])
+def test_get_all_flights_half_cursor_rejected(client, sample_data, cursor_params):
+    response = client.get("/flights", params={"page_size": 1, **cursor_params})
+
+    assert response.status_code == 422
+
+
+def test_get_all_flights_page_past_end(client, sample_data):
+    response = client.get("/flights?page=5&page_size=10")
+
+    assert response.status_code == 200
+
+    response_data = response.json()
+    assert response_data["totalElements"] == 1
+    assert len(response_data["items"]) == 0
+
+
 # ==============================================
 # TEST CASES: GET /flights/{flight_number}
 # ==============================================
@@ -161,6 +168,21 @@ def test_get_flight_by_number_not_found(client, sample_data):
     assert response.status_code == 404
 
 
+# ==============================================
+# TEST CASES: POST /flights/batch
+# ==============================================
+def test_get_flights_by_numbers(client, sample_data):
+    response = client.post("/flights/batch", json=["SU100", "NONEXISTENT", "SU100"])
+
+    assert response.status_code == 200
+
+    response_data = response.json()
+    assert len(response_data) == 1
+    assert response_data[0]["flightNumber"] == "SU100"
+    assert response_data[0]["fromAirport"] == "Moscow SVO Airport"
+    assert response_data[0]["toAirport"] == "Saint Petersburg LED Airport"
+
+
 # ==============================================
 # TEST CASES: Health Check
 # ==============================================
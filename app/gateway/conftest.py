@@ -0,0 +1,88 @@
+import os
+import httpx
+import pytest
+
+# ==============================================
+# TEST CONFIGURATION
+# ==============================================
+# The service clients never reach these hosts, tests mock their transports
+os.environ.setdefault("FLIGHTS_SERVICE_URL", "http://flights")
+os.environ.setdefault("TICKETS_SERVICE_URL", "http://tickets")
+os.environ.setdefault("PRIVILEGES_SERVICE_URL", "http://bonus")
+
+import main
+from services import _breakers
+
+
+@pytest.fixture(scope="session")
+def service():
+    return main
+
+
+# ==============================================
+# DOWNSTREAM SERVICE MOCKS
+# ==============================================
+class FakeService:
+    """
+    Stands in for a downstream service: answers the requests of its client
+    from the registered routes and records them
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self.down = False
+
+    def route(self, method: str, path: str, status_code: int = 200, json=None):
+        self.routes[(method, path)] = (status_code, json)
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append((request.method, request.url.path))
+        if self.down:
+            raise httpx.ConnectError("connection refused", request=request)
+
+        status_code, body = self.routes.get(
+            (request.method, request.url.path), (404, {"detail": "Not found"})
+        )
+        return httpx.Response(status_code, json=body)
+
+    def calls(self, method: str, path: str) -> int:
+        return self.requests.count((method, path))
+
+
+def fake_service(monkeypatch, service_client) -> FakeService:
+    service = FakeService()
+    monkeypatch.setattr(
+        service_client,
+        "_client",
+        httpx.AsyncClient(
+            base_url=service_client.base_url,
+            transport=httpx.MockTransport(service.handle),
+        ),
+    )
+    return service
+
+
+@pytest.fixture
+def flights_service(monkeypatch):
+    return fake_service(monkeypatch, main.flight_client)
+
+
+@pytest.fixture
+def tickets_service(monkeypatch):
+    return fake_service(monkeypatch, main.ticket_client)
+
+
+@pytest.fixture
+def bonus_service(monkeypatch):
+    return fake_service(monkeypatch, main.privilege_client)
+
+
+@pytest.fixture(autouse=True)
+def _reset_gateway_state():
+    # Caches and breakers outlive a request, every test starts from scratch
+    yield
+    main.flight_client.clear_cache()
+    main.privilege_client.clear_cache()
+    for breaker in _breakers.values():
+        breaker.reset()
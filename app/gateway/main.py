@@ -1,6 +1,10 @@
 from fastapi import FastAPI, HTTPException, Header, BackgroundTasks
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
+import asyncio
+import logging
+import random
+import httpx
+from contextlib import asynccontextmanager
 import os
 import datetime
 import uuid
@@ -32,6 +36,12 @@ if not TICKETS_SERVICE_URL:
 if not PRIVILEGES_SERVICE_URL:
     raise RuntimeError("PRIVILEGES_SERVICE_URL environment variable is required")
 
+# Deferred bonus rollbacks keep retrying for this long, enough to outlive
+# a service restart
+REVERT_RETRY_SECONDS = float(os.getenv("REVERT_RETRY_SECONDS", "600"))
+
+logger = logging.getLogger("gateway")
+
 # Initialize service clients
 flight_client = FlightsService(FLIGHTS_SERVICE_URL)
 ticket_client = TicketsService(TICKETS_SERVICE_URL)
@@ -40,7 +50,16 @@ privilege_client = PrivilegesService(PRIVILEGES_SERVICE_URL)
 # ==============================================
 # FASTAPI APPLICATION
 # ==============================================
-app = FastAPI(title="Gateway API", root_path="/api/v1")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Pooled connections of the service clients are closed on shutdown
+    await flight_client.close()
+    await ticket_client.close()
+    await privilege_client.close()
+
+
+app = FastAPI(title="Gateway API", root_path="/api/v1", lifespan=lifespan)
 
 
 # ==============================================
@@ -56,19 +75,63 @@ class TicketPurchaseRequest(BaseModel):
 # HELPER FUNCTIONS
 # ==============================================
 def create_error_response(message: str, status_code: int):
-    return JSONResponse(
+    return ORJSONResponse(
         content=ErrorResponse(message=message).model_dump(),
         status_code=status_code
     )
 
 
+def create_validation_error_response(message: str):
+    return ORJSONResponse(
+        content=ValidationErrorResponse(message=message, errors=[]).model_dump(),
+        status_code=400
+    )
+
+
+@app.middleware("http")
+async def reset_request_cache(request, call_next):
+    # Every request starts with an empty memo of downstream reads
+    request_memo.set({})
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def add_cache_header(request, call_next):
+    # Cached lookups of the request append their status to this list
+    statuses = []
+    cache_statuses.set(statuses)
+    response = await call_next(request)
+    if statuses:
+        response.headers["X-Cache"] = "MISS" if "MISS" in statuses else "HIT"
+    return response
+
+
 @app.exception_handler(CircuitOpenException)
 async def circuit_open_exception_handler(request, exc):
     return create_error_response(f"{exc.service} unavailable", 503)
 
 
-def convert_ticket_to_response(ticket_data):
-    flight_details = flight_client.get_flight_by_number(ticket_data.flight_number)
+@app.exception_handler(httpx.HTTPStatusError)
+async def downstream_status_error_handler(request, exc):
+    if not 400 <= exc.response.status_code < 500:
+        # A failed call the breaker does not guard, the service's own
+        # status and body are not the client's business
+        return create_error_response("Bad gateway", 502)
+
+    # 4xx answers of a service are passed on to the client
+    try:
+        detail = orjson.loads(exc.response.content).get("detail")
+    except (orjson.JSONDecodeError, AttributeError):
+        detail = None
+    message = detail if isinstance(detail, str) else exc.response.reason_phrase
+    return create_error_response(message, exc.response.status_code)
+
+
+_TICKET_RESPONSE_LIST = TypeAdapter(List[TicketResponse])
+_BALANCE_HISTORY_LIST = TypeAdapter(List[BalanceHistory])
+
+
+def convert_ticket_to_response(ticket_data, flight_details):
     return TicketResponse(
         ticketUid=ticket_data.ticket_uid,
         flightNumber=ticket_data.flight_number,
@@ -80,47 +143,92 @@ def convert_ticket_to_response(ticket_data):
     )
 
 
+def raise_first_error(*results):
+    # Results of asyncio.gather(..., return_exceptions=True) in argument order
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+async def convert_tickets_to_responses(tickets):
+    if not tickets:
+        return []
+
+    # One batch request for all distinct flights instead of one per ticket
+    flights_by_number = await flight_client.get_flights_by_numbers(
+        [ticket.flight_number for ticket in tickets]
+    )
+
+    # The whole list is validated in a single pass
+    ticket_rows = []
+    for ticket in tickets:
+        flight_details = (
+            flights_by_number.get(ticket.flight_number) or flight_client.default_flight()
+        )
+        ticket_rows.append({
+            "ticketUid": ticket.ticket_uid,
+            "flightNumber": ticket.flight_number,
+            "fromAirport": flight_details.fromAirport,
+            "toAirport": flight_details.toAirport,
+            "date": flight_details.date,
+            "price": ticket.price,
+            "status": ticket.status,
+        })
+
+    return _TICKET_RESPONSE_LIST.validate_python(ticket_rows)
+
+
 # ==============================================
 # API ENDPOINTS
 # ==============================================
-@app.get("/flights", response_model=PaginationResponse)
-def retrieve_flights(page: int = None, size: int = None):
-    return flight_client.get_all_flights(page, size)
+# The public API pages by number only, the keyset cursor stays between the services
+@app.get("/flights", response_model=PaginationResponse, response_model_exclude={"nextCursor"})
+async def retrieve_flights(page: int = None, size: int = None):
+    return await flight_client.get_all_flights(page, size)
 
 
 @app.get("/tickets")
-def retrieve_user_tickets(x_user_name: str = Header()) -> List[TicketResponse]:
-    user_privilege = privilege_client.get_user_privilege(x_user_name)
+async def retrieve_user_tickets(x_user_name: str = Header()) -> List[TicketResponse]:
+    user_privilege, user_tickets = await asyncio.gather(
+        privilege_client.get_user_privilege(x_user_name),
+        ticket_client.get_user_tickets(x_user_name),
+        return_exceptions=True,
+    )
+    # An unknown user is reported as such, whatever happened to the tickets lookup
+    raise_first_error(user_privilege)
     if not user_privilege:
         return create_error_response("User account not found", 404)
+    raise_first_error(user_tickets)
 
-    user_tickets = ticket_client.get_user_tickets(x_user_name)
-    ticket_responses = []
-
-    for ticket in user_tickets:
-        ticket_responses.append(convert_ticket_to_response(ticket))
-
-    return ticket_responses
+    return await convert_tickets_to_responses(user_tickets)
 
 
 @app.get("/me")
-def get_current_user_profile(x_user_name: str = Header()) -> UserInfoResponse | ErrorResponse:
-    try:
-        user_privilege = privilege_client.get_user_privilege(x_user_name)
-        if not user_privilege:
-            return create_error_response("User account not found", 404)
-    except CircuitOpenException:
-        user_privilege = None
-
-    try:
-        user_tickets = ticket_client.get_user_tickets(x_user_name)
-        formatted_tickets = []
+async def get_current_user_profile(x_user_name: str = Header()) -> UserInfoResponse | ErrorResponse:
+    # Both services are queried at once, either one may be unavailable
+    user_privilege, user_tickets = await asyncio.gather(
+        privilege_client.get_user_privilege(x_user_name),
+        ticket_client.get_user_tickets(x_user_name),
+        return_exceptions=True,
+    )
 
-        for ticket in user_tickets:
-            formatted_tickets.append(convert_ticket_to_response(ticket))
+    if isinstance(user_privilege, CircuitOpenException):
+        user_privilege = None
+    elif isinstance(user_privilege, BaseException):
+        raise user_privilege
+    elif not user_privilege:
+        return create_error_response("User account not found", 404)
 
-    except CircuitOpenException:
+    if isinstance(user_tickets, CircuitOpenException):
         formatted_tickets = []
+    elif isinstance(user_tickets, BaseException):
+        raise user_tickets
+    else:
+        try:
+            formatted_tickets = await convert_tickets_to_responses(user_tickets)
+        except CircuitOpenException:
+            formatted_tickets = []
 
     if user_privilege is None:
         return UserInfoResponse(tickets=formatted_tickets, privilege="")
@@ -135,56 +243,51 @@ def get_current_user_profile(x_user_name: str = Header()) -> UserInfoResponse |
 
 
 @app.get("/tickets/{ticket_uid}")
-def retrieve_ticket_details(
+async def retrieve_ticket_details(
         ticket_uid: uuid.UUID,
         x_user_name: str = Header()
 ) -> TicketResponse | ErrorResponse:
-    ticket_info = ticket_client.get_ticket_by_uid(ticket_uid)
+    ticket_info = await ticket_client.get_ticket_by_uid(ticket_uid)
     if not ticket_info:
         return create_error_response("Ticket not found", 404)
 
     if ticket_info.username != x_user_name:
         return create_error_response("Ticket does not belong to user", 403)
 
-    flight_info = flight_client.get_flight_by_number(ticket_info.flight_number)
+    flight_info = await flight_client.get_flight_by_number(ticket_info.flight_number)
     if not flight_info:
         return create_error_response("Flight information not available", 404)
 
-    return TicketResponse(
-        ticketUid=ticket_info.ticket_uid,
-        flightNumber=ticket_info.flight_number,
-        fromAirport=flight_info.fromAirport,
-        toAirport=flight_info.toAirport,
-        date=flight_info.date,
-        price=ticket_info.price,
-        status=ticket_info.status,
-    )
+    return convert_ticket_to_response(ticket_info, flight_info)
 
 
 @app.post("/tickets")
-def purchase_ticket(
+async def purchase_ticket(
         purchase_request: TicketPurchaseRequest,
         x_user_name: str = Header()
 ) -> TicketPurchaseResponse | ValidationErrorResponse:
-    flight_info = flight_client.get_flight_by_number(purchase_request.flightNumber)
+    flight_info, user_privilege = await asyncio.gather(
+        flight_client.get_flight_by_number(purchase_request.flightNumber),
+        privilege_client.get_user_privilege(x_user_name),
+        return_exceptions=True,
+    )
+    # Checked in order, an unknown flight is reported whatever happened to the user lookup
+    raise_first_error(flight_info)
     if not flight_info:
-        return ValidationErrorResponse(
-            message="Data validation failed",
-            errors=[]
-        )
+        return create_validation_error_response("Data validation failed")
 
-    user_privilege = privilege_client.get_user_privilege(x_user_name)
+    raise_first_error(user_privilege)
     if not user_privilege:
-        return ValidationErrorResponse(
-            message="User does not exist",
-            errors=[]
-        )
+        return create_validation_error_response("User does not exist")
 
-    current_time = datetime.now()
-    new_ticket_id = uuid.uuid4()
+    # Time-ordered id, its timestamp doubles as the purchase time
+    new_ticket_id = uuid7()
+    current_time = uuid7_datetime(new_ticket_id)
 
     cash_payment = flight_info.price
     bonus_payment = 0
+    # Stays as read up front if no transaction is added
+    updated_privilege = user_privilege
 
     if purchase_request.paidFromBalance:
         bonus_amount = min(user_privilege.balance, flight_info.price)
@@ -192,7 +295,7 @@ def purchase_ticket(
         cash_payment = flight_info.price - bonus_payment
 
         if bonus_payment > 0:
-            privilege_client.add_privilege_transaction(
+            updated_privilege = await privilege_client.add_privilege_transaction(
                 x_user_name,
                 AddTransactionRequest(
                     privilege_id=user_privilege.id,
@@ -203,7 +306,7 @@ def purchase_ticket(
                 ),
             )
     else:
-        privilege_client.add_privilege_transaction(
+        updated_privilege = await privilege_client.add_privilege_transaction(
             x_user_name,
             AddTransactionRequest(
                 privilege_id=user_privilege.id,
@@ -214,8 +317,7 @@ def purchase_ticket(
             ),
         )
 
-    updated_privilege = privilege_client.get_user_privilege(x_user_name)
-    ticket_client.create_new_ticket(
+    await ticket_client.create_new_ticket(
         new_ticket_id, x_user_name, flight_info.flightNumber, cash_payment
     )
 
@@ -236,25 +338,50 @@ def purchase_ticket(
     )
 
 
-def cancel_with_retry(
-    x_user_name, ticket_uid, max_seconds: int = 10, interval: int = 1
+async def cancel_with_retry(
+    x_user_name,
+    ticket_uid,
+    max_seconds: float = REVERT_RETRY_SECONDS,
+    base: float = 0.2,
+    cap: float = 5.0,
 ):
-    deadline = time.time() + max_seconds
-    while time.time() < deadline:
+    deadline = time.monotonic() + max_seconds
+    attempt = 0
+    while True:
         try:
-            if privilege_client.get_user_privelge_transaction(
-                x_user_name, ticket_uid
-            ):
-                privilege_client.rollback_transaction(x_user_name, ticket_uid)
-                print("deleted", time.time())
-                break
+            await privilege_client.revert_transaction(x_user_name, ticket_uid)
+            return
+        except httpx.HTTPStatusError as exc:
+            if exc.response.status_code != 404:
+                logger.error(
+                    "Bonus service rejected reverting transaction of ticket %s "
+                    "for %s with %s, giving up",
+                    ticket_uid, x_user_name, exc.response.status_code,
+                )
+            # 404: the transaction is already gone
+            return
         except CircuitOpenException:
-            time.sleep(interval)
+            # Full jitter on top of the time the breaker still stays open; the
+            # exponent is capped, a long outage must not overflow the float
+            backoff = random.uniform(0, min(cap, base * 2 ** min(attempt, 10)))
+            delay = get_breaker(privilege_client.NAME).retry_after() + backoff
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.error(
+                    "Bonus service unavailable for %.0fs, transaction of ticket %s "
+                    "for %s was not reverted",
+                    max_seconds, ticket_uid, x_user_name,
+                )
+                return
+
+            attempt += 1
+            # The last attempt is made right at the deadline
+            await asyncio.sleep(min(delay, remaining))
 
 
 @app.delete("/tickets/{ticket_uid}", status_code=204)
-def cancel_ticket(ticket_uid: uuid.UUID, background_tasks: BackgroundTasks, x_user_name: str = Header()):
-    ticket_info = ticket_client.get_ticket_by_uid(ticket_uid)
+async def cancel_ticket(ticket_uid: uuid.UUID, background_tasks: BackgroundTasks, x_user_name: str = Header()):
+    ticket_info = await ticket_client.get_ticket_by_uid(ticket_uid)
     if not ticket_info:
         return create_error_response("Ticket does not exist", 404)
 
@@ -264,43 +391,38 @@ def cancel_ticket(ticket_uid: uuid.UUID, background_tasks: BackgroundTasks, x_us
     if ticket_info.status != "PAID":
         return create_error_response("Ticket cannot be cancelled", 400)
 
-    transaction_record = privilege_client.get_user_privilege_transaction(
+    # An unavailable bonus service fails the cancel before the ticket is removed
+    transaction_record = await privilege_client.get_user_privilege_transaction(
         x_user_name, ticket_uid
     )
-    if transaction_record:
-        privilege_client.revert_transaction(x_user_name, ticket_uid)
 
-    ticket_client.remove_ticket(ticket_uid)
+    await ticket_client.remove_ticket(ticket_uid)
 
-    background_tasks.add_task(lambda: cancel_with_retry(x_user_name, ticket_uid))
+    if transaction_record:
+        # The transaction is rolled back after the response has been sent
+        background_tasks.add_task(cancel_with_retry, x_user_name, ticket_uid)
 
 
 @app.get("/privilege")
-def get_user_privilege_info(x_user_name: str = Header()) -> PrivilegeInfoResponse:
-    privilege_data = privilege_client.get_user_privilege(x_user_name)
+async def get_user_privilege_info(x_user_name: str = Header()) -> PrivilegeInfoResponse:
+    privilege_data, history_data = await asyncio.gather(
+        privilege_client.get_user_privilege(x_user_name),
+        privilege_client.get_user_privilege_history(x_user_name),
+        return_exceptions=True,
+    )
+    raise_first_error(privilege_data)
     if not privilege_data:
         return create_error_response("User does not exist", 404)
-
-    history_data = privilege_client.get_user_privilege_history(x_user_name)
-    history_entries = []
-
-    for history_item in history_data:
-        history_entries.append(
-            BalanceHistory(
-                date=history_item.datetime,
-                ticketUid=history_item.ticket_uid,
-                balanceDiff=history_item.balance_diff,
-                operationType=history_item.operation_type,
-            )
-        )
+    raise_first_error(history_data)
 
     return PrivilegeInfoResponse(
         balance=privilege_data.balance,
         status=privilege_data.status,
-        history=history_entries
+        # History entries map onto BalanceHistory through its aliases
+        history=_BALANCE_HISTORY_LIST.validate_python(history_data, from_attributes=True),
     )
 
 
 @app.get("/manage/health", status_code=201)
-def health_check():
+async def health_check():
     return {"status": "operational"}
\ No newline at end of file
@@ -0,0 +1,713 @@
+import asyncio
+import uuid
+import httpx
+import pytest
+from cachetools import TTLCache
+from datetime import datetime
+import os
+import sys
+import inspect
+
+# ==============================================
+# IMPORT CONFIGURATION
+# ==============================================
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+import common
+import main
+from circuit_breaker import CircuitBreaker, CircuitOpenException
+from services import (
+    FlightsService,
+    async_cached,
+    breaker_setting,
+    cache_statuses,
+    is_service_failure,
+    request_cache,
+    request_memo,
+)
+
+
+# ==============================================
+# HELPERS
+# ==============================================
+RECOVERY_TIMEOUT = 0.05
+
+
+async def succeed(value=1, delay=0):
+    await asyncio.sleep(delay)
+    return value
+
+
+async def fail():
+    raise httpx.ConnectError("connection refused")
+
+
+async def reject(status_code=404):
+    request = httpx.Request("GET", "http://bonus/privilege/test_client")
+    response = httpx.Response(status_code, request=request)
+    raise httpx.HTTPStatusError("rejected", request=request, response=response)
+
+
+async def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(CircuitOpenException):
+            await breaker.call_async(fail)
+    assert breaker.state == "open"
+
+
+# ==============================================
+# TEST CASES: CircuitBreaker states
+# ==============================================
+@pytest.mark.asyncio
+async def test_opens_after_failure_threshold():
+    breaker = CircuitBreaker("bonus", failure_threshold=3, recovery_timeout=RECOVERY_TIMEOUT)
+    await open_breaker(breaker)
+
+    # Rejected without reaching the service
+    with pytest.raises(CircuitOpenException):
+        await breaker.call_async(succeed)
+    assert breaker.retry_after() > 0
+
+
+@pytest.mark.asyncio
+async def test_half_open_probe_success_closes():
+    breaker = CircuitBreaker("bonus", failure_threshold=1, recovery_timeout=RECOVERY_TIMEOUT)
+    await open_breaker(breaker)
+    await asyncio.sleep(RECOVERY_TIMEOUT)
+
+    assert breaker.retry_after() == 0
+    assert await breaker.call_async(succeed) == 1
+    assert breaker.state == "closed"
+    assert breaker.fail_count == 0
+
+
+@pytest.mark.asyncio
+async def test_half_open_probe_failure_reopens():
+    breaker = CircuitBreaker("bonus", failure_threshold=3, recovery_timeout=RECOVERY_TIMEOUT)
+    await open_breaker(breaker)
+    await asyncio.sleep(RECOVERY_TIMEOUT)
+
+    with pytest.raises(CircuitOpenException):
+        await breaker.call_async(fail)
+    assert breaker.state == "open"
+
+
+@pytest.mark.asyncio
+async def test_half_open_callers_wait_for_probe():
+    breaker = CircuitBreaker("bonus", failure_threshold=1, recovery_timeout=RECOVERY_TIMEOUT)
+    await open_breaker(breaker)
+    await asyncio.sleep(RECOVERY_TIMEOUT)
+
+    # Only one trial call at a time, the rest follow once it succeeds
+    results = await asyncio.gather(*(breaker.call_async(succeed, i, 0.01) for i in range(3)))
+
+    assert results == [0, 1, 2]
+    assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_half_open_callers_rejected_when_probe_fails():
+    breaker = CircuitBreaker("bonus", failure_threshold=1, recovery_timeout=RECOVERY_TIMEOUT)
+    await open_breaker(breaker)
+    await asyncio.sleep(RECOVERY_TIMEOUT)
+
+    async def fail_slowly():
+        await asyncio.sleep(0.01)
+        await fail()
+
+    results = await asyncio.gather(
+        breaker.call_async(fail_slowly),
+        breaker.call_async(succeed),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(result, CircuitOpenException) for result in results)
+    assert breaker.state == "open"
+
+
+# ==============================================
+# TEST CASES: client errors
+# ==============================================
+@pytest.mark.asyncio
+async def test_client_errors_pass_through():
+    breaker = CircuitBreaker("bonus", failure_threshold=1, is_failure=is_service_failure)
+
+    with pytest.raises(httpx.HTTPStatusError) as exc_info:
+        await breaker.call_async(reject)
+
+    assert exc_info.value.response.status_code == 404
+    assert breaker.state == "closed"
+    assert breaker.fail_count == 0
+
+
+@pytest.mark.asyncio
+async def test_server_errors_count_as_failures():
+    breaker = CircuitBreaker("bonus", failure_threshold=1, is_failure=is_service_failure)
+
+    with pytest.raises(CircuitOpenException):
+        await breaker.call_async(reject, 500)
+
+    assert breaker.state == "open"
+
+
+@pytest.mark.asyncio
+async def test_unknown_flight_returns_none():
+    flights = FlightsService("http://flights")
+    flights._client = httpx.AsyncClient(
+        base_url="http://flights",
+        transport=httpx.MockTransport(lambda request: httpx.Response(404)),
+    )
+
+    assert await flights.get_flight_by_number("XXX000") is None
+    await flights.close()
+
+
+# ==============================================
+# TEST CASES: slow calls
+# ==============================================
+@pytest.mark.asyncio
+async def test_slow_calls_open_breaker():
+    breaker = CircuitBreaker(
+        "bonus",
+        failure_threshold=2,
+        recovery_timeout=RECOVERY_TIMEOUT,
+        slow_call_duration=0.01,
+        latency_smoothing=1.0,
+    )
+
+    # Slow responses still come through, but count against the service
+    assert await breaker.call_async(succeed, 1, 0.02) == 1
+    assert breaker.fail_count == 1
+    assert await breaker.call_async(succeed, 1, 0.02) == 1
+    assert breaker.state == "open"
+
+
+@pytest.mark.asyncio
+async def test_slow_call_average_reset_after_recovery():
+    breaker = CircuitBreaker(
+        "bonus",
+        failure_threshold=1,
+        recovery_timeout=RECOVERY_TIMEOUT,
+        slow_call_duration=0.05,
+        latency_smoothing=0.1,
+    )
+    await breaker.call_async(succeed, 1, 0.2)
+    assert breaker.state == "open"
+    await asyncio.sleep(RECOVERY_TIMEOUT)
+
+    # A fast probe closes, and the outage latency no longer weighs on later calls
+    await breaker.call_async(succeed)
+    await breaker.call_async(succeed)
+
+    assert breaker.state == "closed"
+    assert breaker.latency_ema < breaker.slow_call_duration
+
+
+# ==============================================
+# TEST CASES: breaker settings
+# ==============================================
+def test_breaker_setting_per_service(monkeypatch):
+    monkeypatch.setenv("CB_FAILURE_THRESHOLD", "7")
+    monkeypatch.setenv("BONUS_SERVICE_CB_FAILURE_THRESHOLD", "2")
+
+    assert breaker_setting("Bonus Service", "FAILURE_THRESHOLD", 5) == 2
+    assert breaker_setting("Flights Service", "FAILURE_THRESHOLD", 5) == 7
+
+
+def test_breaker_setting_default(monkeypatch):
+    monkeypatch.delenv("CB_SLOW_CALL_SECONDS", raising=False)
+    monkeypatch.delenv("BONUS_SERVICE_CB_SLOW_CALL_SECONDS", raising=False)
+
+    assert breaker_setting("Bonus Service", "SLOW_CALL_SECONDS", 3.0, float) == 3.0
+
+
+# ==============================================
+# TEST CASES: async_cached
+# ==============================================
+@pytest.mark.asyncio
+async def test_cached_fetch_not_stored_after_invalidation():
+    balances = {"test_client": 500}
+    fetch_started, write_done = asyncio.Event(), asyncio.Event()
+
+    @async_cached(TTLCache(maxsize=10, ttl=30))
+    async def get_balance(self, username):
+        balance = balances[username]
+        fetch_started.set()
+        await write_done.wait()
+        return balance
+
+    reader = asyncio.create_task(get_balance(None, "test_client"))
+    await fetch_started.wait()
+    balances["test_client"] = 0
+    get_balance.invalidate("test_client")
+    write_done.set()
+
+    # The in-flight read predates the write, so it must not be cached
+    assert await reader == 500
+    assert "test_client" not in get_balance.cache
+    assert await get_balance(None, "test_client") == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_fetch():
+    fetches = []
+
+    @async_cached(TTLCache(maxsize=10, ttl=30))
+    async def get_flight(self, flight_number):
+        fetches.append(flight_number)
+        await asyncio.sleep(0.01)
+        return flight_number
+
+    results = await asyncio.gather(*(get_flight(None, "AFL031") for _ in range(4)))
+
+    assert results == ["AFL031"] * 4
+    assert fetches == ["AFL031"]
+    assert await get_flight(None, "AFL031") == "AFL031"
+    assert fetches == ["AFL031"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_failing_misses_share_one_fetch():
+    fetches = []
+
+    @async_cached(TTLCache(maxsize=10, ttl=30))
+    async def get_flight(self, flight_number):
+        fetches.append(flight_number)
+        await asyncio.sleep(0.01)
+        raise CircuitOpenException("Flights Service")
+
+    # Every caller gets the error of the single fetch instead of retrying it in turn
+    results = await asyncio.gather(
+        *(get_flight(None, "AFL031") for _ in range(4)),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(result, CircuitOpenException) for result in results)
+    assert fetches == ["AFL031"]
+    assert "AFL031" not in get_flight.cache
+
+    # Errors are not cached, the next miss fetches again
+    with pytest.raises(CircuitOpenException):
+        await get_flight(None, "AFL031")
+    assert len(fetches) == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_fetch_shares_single_fetch_in_flight():
+    fetches, batches = [], []
+
+    @async_cached(TTLCache(maxsize=10, ttl=30))
+    async def get_flight(self, flight_number):
+        fetches.append(flight_number)
+        await asyncio.sleep(0.01)
+        return flight_number
+
+    async def fetch_flights(self, flight_numbers):
+        batches.append(flight_numbers)
+        return {number: number for number in flight_numbers}
+
+    single = asyncio.create_task(get_flight(None, "AFL031"))
+    await asyncio.sleep(0)
+    flights = await get_flight.get_many(None, ["AFL031", "AFL032", "AFL031"], fetch_flights)
+
+    assert flights == {"AFL031": "AFL031", "AFL032": "AFL032"}
+    assert await single == "AFL031"
+    assert fetches == ["AFL031"]
+    assert batches == [["AFL032"]]
+    assert set(get_flight.cache) == {"AFL031", "AFL032"}
+
+
+@pytest.mark.asyncio
+async def test_batch_fetch_not_stored_after_invalidation():
+    fetch_started, write_done = asyncio.Event(), asyncio.Event()
+
+    @async_cached(TTLCache(maxsize=10, ttl=30))
+    async def get_flight(self, flight_number):
+        return "new"
+
+    async def fetch_flights(self, flight_numbers):
+        fetch_started.set()
+        await write_done.wait()
+        return {number: "old" for number in flight_numbers}
+
+    batch = asyncio.create_task(get_flight.get_many(None, ["AFL031"], fetch_flights))
+    await fetch_started.wait()
+    get_flight.invalidate("AFL031")
+    write_done.set()
+
+    assert await batch == {"AFL031": "old"}
+    assert "AFL031" not in get_flight.cache
+    assert await get_flight(None, "AFL031") == "new"
+
+
+@pytest.mark.asyncio
+async def test_stored_value_wins_over_fetch_in_flight():
+    fetch_started, write_done = asyncio.Event(), asyncio.Event()
+
+    @async_cached(TTLCache(maxsize=10, ttl=30))
+    async def get_balance(self, username):
+        fetch_started.set()
+        await write_done.wait()
+        return 500
+
+    reader = asyncio.create_task(get_balance(None, "test_client"))
+    await fetch_started.wait()
+    get_balance.store("test_client", 350)
+    write_done.set()
+
+    assert await reader == 500
+    assert get_balance.cache["test_client"] == 350
+
+    get_balance.clear()
+    assert "test_client" not in get_balance.cache
+
+
+@pytest.mark.asyncio
+async def test_request_memo_hit_reported_as_cache_hit():
+    statuses = []
+    cache_statuses.set(statuses)
+    request_memo.set({})
+
+    class Client:
+        @request_cache
+        @async_cached(TTLCache(maxsize=10, ttl=30))
+        async def get_balance(self, username):
+            return 500
+
+    client = Client()
+    await client.get_balance("test_client")
+    await client.get_balance("test_client")
+
+    assert statuses == ["MISS", "HIT"]
+
+
+@pytest.mark.asyncio
+async def test_request_memo_accepts_keyword_arguments():
+    request_memo.set({})
+    fetches = []
+
+    class Client:
+        @request_cache
+        async def get_transaction(self, username, ticket_uid=None):
+            fetches.append((username, ticket_uid))
+            return ticket_uid
+
+    client = Client()
+    assert await client.get_transaction("test_client", ticket_uid=1) == 1
+    assert await client.get_transaction("test_client", ticket_uid=1) == 1
+    assert await client.get_transaction("test_client", ticket_uid=2) == 2
+
+    assert fetches == [("test_client", 1), ("test_client", 2)]
+
+
+# ==============================================
+# TEST DATA: downstream service payloads
+# ==============================================
+USERNAME = "test_client"
+TICKET_UID = "049161bb-badd-4fa8-9d90-87c9a82b0668"
+
+FLIGHT = {
+    "flightNumber": "AFL031",
+    "fromAirport": "Санкт-Петербург Пулково",
+    "toAirport": "Москва Шереметьево",
+    "date": "2021-10-08T20:00:00",
+    "price": 1500,
+}
+
+TICKET = {
+    "id": 1,
+    "ticket_uid": TICKET_UID,
+    "username": USERNAME,
+    "flight_number": "AFL031",
+    "price": 1500,
+    "status": "PAID",
+}
+
+PRIVILEGE = {"id": 1, "username": USERNAME, "status": "GOLD", "balance": 500}
+
+HISTORY_ENTRY = {
+    "id": 1,
+    "privilege_id": 1,
+    "ticket_uid": TICKET_UID,
+    "datetime": "2021-10-08T19:59:19",
+    "balance_diff": 150,
+    "operation_type": "FILL_IN_BALANCE",
+}
+
+
+# ==============================================
+# TEST CASES: flight cache
+# ==============================================
+def test_flights_cached_across_requests(client, flights_service, tickets_service):
+    tickets_service.route("GET", f"/tickets/{TICKET_UID}", json=TICKET)
+    flights_service.route("GET", "/flights/AFL031", json=FLIGHT)
+
+    for _ in range(2):
+        response = client.get(f"/tickets/{TICKET_UID}", headers={"X-User-Name": USERNAME})
+        assert response.status_code == 200
+        assert response.json()["fromAirport"] == FLIGHT["fromAirport"]
+    assert flights_service.calls("GET", "/flights/AFL031") == 1
+
+    main.flight_client.clear_cache()
+    client.get(f"/tickets/{TICKET_UID}", headers={"X-User-Name": USERNAME})
+    assert flights_service.calls("GET", "/flights/AFL031") == 2
+
+
+# ==============================================
+# TEST CASES: error precedence of concurrent lookups
+# ==============================================
+def test_unknown_user_reported_while_tickets_down(client, bonus_service, tickets_service):
+    tickets_service.down = True
+
+    response = client.get("/tickets", headers={"X-User-Name": "nobody"})
+
+    assert response.status_code == 404
+
+
+def test_unknown_flight_reported_while_bonus_down(client, flights_service, bonus_service):
+    bonus_service.down = True
+
+    response = client.post(
+        "/tickets",
+        json={"flightNumber": "XXX000", "price": 1500, "paidFromBalance": False},
+        headers={"X-User-Name": USERNAME},
+    )
+
+    assert response.status_code == 400
+    assert response.json()["message"] == "Data validation failed"
+
+
+def test_known_user_with_tickets_down_unavailable(client, bonus_service, tickets_service):
+    bonus_service.route("GET", f"/privilege/{USERNAME}", json=PRIVILEGE)
+    tickets_service.down = True
+
+    response = client.get("/tickets", headers={"X-User-Name": USERNAME})
+
+    assert response.status_code == 503
+
+
+# ==============================================
+# TEST CASES: DELETE /tickets/{ticket_uid}
+# ==============================================
+def test_cancel_reverts_transaction_in_background(client, tickets_service, bonus_service):
+    tickets_service.route("GET", f"/tickets/{TICKET_UID}", json=TICKET)
+    tickets_service.route("DELETE", f"/tickets/{TICKET_UID}", 204)
+    history_path = f"/privilege/{USERNAME}/history/{TICKET_UID}"
+    bonus_service.route("GET", history_path, json=HISTORY_ENTRY)
+    bonus_service.route("DELETE", history_path, 204)
+
+    response = client.delete(f"/tickets/{TICKET_UID}", headers={"X-User-Name": USERNAME})
+
+    assert response.status_code == 204
+    assert tickets_service.calls("DELETE", f"/tickets/{TICKET_UID}") == 1
+    # TestClient returns once the background tasks have run
+    assert bonus_service.calls("DELETE", history_path) == 1
+
+
+def test_cancel_fails_while_bonus_down(client, tickets_service, bonus_service):
+    tickets_service.route("GET", f"/tickets/{TICKET_UID}", json=TICKET)
+    tickets_service.route("DELETE", f"/tickets/{TICKET_UID}", 204)
+    bonus_service.down = True
+
+    response = client.delete(f"/tickets/{TICKET_UID}", headers={"X-User-Name": USERNAME})
+
+    assert response.status_code == 503
+    assert tickets_service.calls("DELETE", f"/tickets/{TICKET_UID}") == 0
+
+
+def test_cancel_of_unknown_ticket(client, tickets_service, bonus_service):
+    response = client.delete(f"/tickets/{TICKET_UID}", headers={"X-User-Name": USERNAME})
+
+    assert response.status_code == 404
+    assert bonus_service.requests == []
+
+
+@pytest.mark.asyncio
+async def test_revert_of_missing_transaction_is_done(bonus_service):
+    history_path = f"/privilege/{USERNAME}/history/{TICKET_UID}"
+
+    await main.cancel_with_retry(USERNAME, TICKET_UID, max_seconds=1)
+
+    # 404: already reverted, nothing to retry
+    assert bonus_service.calls("DELETE", history_path) == 1
+
+
+# ==============================================
+# TEST CASES: POST /tickets
+# ==============================================
+def test_purchase_reports_privilege_returned_by_transaction(
+        client, flights_service, tickets_service, bonus_service
+):
+    flights_service.route("GET", "/flights/AFL031", json=FLIGHT)
+    tickets_service.route("POST", "/tickets", 201)
+    bonus_service.route("GET", f"/privilege/{USERNAME}", json=PRIVILEGE)
+    bonus_service.route(
+        "POST", f"/privilege/{USERNAME}/history", 201, json={**PRIVILEGE, "balance": 0}
+    )
+
+    response = client.post(
+        "/tickets",
+        json={"flightNumber": "AFL031", "price": 1500, "paidFromBalance": True},
+        headers={"X-User-Name": USERNAME},
+    )
+
+    assert response.status_code == 200
+    response_data = response.json()
+    assert response_data["paidByBonuses"] == 500
+    assert response_data["paidByMoney"] == 1000
+    assert response_data["privilege"] == {"balance": 0, "status": "GOLD"}
+    # The balance after the purchase is not read again
+    assert bonus_service.calls("GET", f"/privilege/{USERNAME}") == 1
+
+
+# ==============================================
+# TEST CASES: request memo and X-Cache
+# ==============================================
+def test_cache_header_reports_privilege_cache(client, bonus_service):
+    bonus_service.route("GET", f"/privilege/{USERNAME}", json=PRIVILEGE)
+    bonus_service.route("GET", f"/privilege/{USERNAME}/history", json=[HISTORY_ENTRY])
+
+    first = client.get("/privilege", headers={"X-User-Name": USERNAME})
+    second = client.get("/privilege", headers={"X-User-Name": USERNAME})
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert bonus_service.calls("GET", f"/privilege/{USERNAME}") == 1
+
+
+def test_requests_without_cached_reads_have_no_cache_header(client, tickets_service):
+    tickets_service.route("GET", f"/tickets/{TICKET_UID}", json=TICKET)
+
+    response = client.get(f"/tickets/{TICKET_UID}", headers={"X-User-Name": "someone_else"})
+
+    assert response.status_code == 403
+    assert "X-Cache" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_ticket_write_clears_request_memo(tickets_service):
+    tickets_service.route("GET", f"/tickets/{TICKET_UID}", json=TICKET)
+    tickets_service.route("DELETE", f"/tickets/{TICKET_UID}", 204)
+    # As set by the gateway middleware at the start of a request
+    request_memo.set({})
+
+    await main.ticket_client.get_ticket_by_uid(TICKET_UID)
+    await main.ticket_client.get_ticket_by_uid(TICKET_UID)
+    assert tickets_service.calls("GET", f"/tickets/{TICKET_UID}") == 1
+
+    await main.ticket_client.remove_ticket(TICKET_UID)
+    await main.ticket_client.get_ticket_by_uid(TICKET_UID)
+    assert tickets_service.calls("GET", f"/tickets/{TICKET_UID}") == 2
+
+
+# ==============================================
+# TEST CASES: uuid7
+# ==============================================
+FIXED_NS = 1_700_000_000_123_456_789
+
+
+@pytest.fixture
+def frozen_clock(monkeypatch):
+    monkeypatch.setattr(common.time, "time_ns", lambda: FIXED_NS)
+    monkeypatch.setattr(common, "_uuid7_last_ms", 0)
+    monkeypatch.setattr(common, "_uuid7_counter", 0)
+    return FIXED_NS // 1_000_000
+
+
+def test_uuid7_version_and_variant():
+    value = common.uuid7()
+
+    assert value.version == 7
+    assert value.variant == uuid.RFC_4122
+
+
+def test_uuid7_monotonic_within_millisecond(frozen_clock):
+    values = [common.uuid7() for _ in range(100)]
+
+    assert values == sorted(values)
+    assert len(set(values)) == 100
+    assert all(value.int >> 80 == frozen_clock for value in values)
+    # The 12-bit counter follows the version nibble
+    assert [(value.int >> 64) & 0xFFF for value in values] == list(range(100))
+
+
+def test_uuid7_counter_rollover_borrows_next_millisecond(frozen_clock):
+    values = [common.uuid7() for _ in range(0x1000 + 1)]
+
+    assert values == sorted(values)
+    assert values[-2].int >> 80 == frozen_clock
+    assert (values[-2].int >> 64) & 0xFFF == 0xFFF
+    assert values[-1].int >> 80 == frozen_clock + 1
+    assert (values[-1].int >> 64) & 0xFFF == 0
+    assert values[-1].version == 7
+
+
+def test_uuid7_datetime_round_trip(frozen_clock):
+    value = common.uuid7()
+
+    assert common.uuid7_datetime(value) == datetime.fromtimestamp(frozen_clock / 1000)
+
+
+# ==============================================
+# TEST CASES: GET /privilege
+# ==============================================
+def test_privilege_history_mapped_from_bonus_entries(client, bonus_service):
+    bonus_service.route("GET", f"/privilege/{USERNAME}", json=PRIVILEGE)
+    bonus_service.route("GET", f"/privilege/{USERNAME}/history", json=[HISTORY_ENTRY])
+
+    response = client.get("/privilege", headers={"X-User-Name": USERNAME})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "balance": 500,
+        "status": "GOLD",
+        "history": [
+            {
+                "date": "2021-10-08T19:59:19",
+                "ticketUid": TICKET_UID,
+                "balanceDiff": 150,
+                "operationType": "FILL_IN_BALANCE",
+            }
+        ],
+    }
+
+
+def test_balance_history_accepts_bonus_field_names():
+    entry = common.BalanceHistory.model_validate(HISTORY_ENTRY)
+
+    assert entry.ticketUid == uuid.UUID(TICKET_UID)
+    assert entry.balanceDiff == 150
+    assert entry.operationType == "FILL_IN_BALANCE"
+    assert entry.date == datetime(2021, 10, 8, 19, 59, 19)
+
+
+# ==============================================
+# TEST CASES: downstream error statuses
+# ==============================================
+def purchase_with_failing_transaction(client, flights_service, bonus_service, status_code):
+    flights_service.route("GET", "/flights/AFL031", json=FLIGHT)
+    bonus_service.route("GET", f"/privilege/{USERNAME}", json=PRIVILEGE)
+    bonus_service.route(
+        "POST", f"/privilege/{USERNAME}/history", status_code, json={"detail": "Rejected"}
+    )
+    return client.post(
+        "/tickets",
+        json={"flightNumber": "AFL031", "price": 1500, "paidFromBalance": False},
+        headers={"X-User-Name": USERNAME},
+    )
+
+
+def test_downstream_client_error_passed_through(client, flights_service, bonus_service):
+    response = purchase_with_failing_transaction(client, flights_service, bonus_service, 409)
+
+    assert response.status_code == 409
+    assert response.json() == {"message": "Rejected"}
+
+
+def test_downstream_server_error_reported_as_bad_gateway(client, flights_service, bonus_service):
+    response = purchase_with_failing_transaction(client, flights_service, bonus_service, 500)
+
+    assert response.status_code == 502
+    assert response.json() == {"message": "Bad gateway"}
@@ -1,23 +1,235 @@
 from common import *
-import requests
+import asyncio
+import os
+import httpx
+import orjson
+from cachetools import TTLCache
 from circuit_breaker import CircuitBreaker, CircuitOpenException
+from contextvars import ContextVar
 from functools import wraps
+from pydantic import TypeAdapter
+
+# List validators are built once instead of validating item by item
+_FLIGHT_LIST = TypeAdapter(list[FlightResponse])
+_TICKET_LIST = TypeAdapter(list[Ticket])
+_HISTORY_LIST = TypeAdapter(list[PrivilegeHistory])
+
+# Cache lookups of the current request, reported in the X-Cache header
+cache_statuses: ContextVar[list | None] = ContextVar("cache_statuses", default=None)
+
+# Results of read calls made during the current request
+request_memo: ContextVar[dict | None] = ContextVar("request_memo", default=None)
+
+
+def breaker_setting(service: str, name: str, default, cast=int):
+    # e.g. BONUS_SERVICE_CB_FAILURE_THRESHOLD, falling back to CB_FAILURE_THRESHOLD
+    service_key = service.upper().replace(" ", "_")
+    value = os.getenv(f"{service_key}_CB_{name}", os.getenv(f"CB_{name}"))
+    return default if value is None else cast(value)
+
+
+def is_service_failure(exc: Exception) -> bool:
+    # 4xx responses are the caller's problem, not a sign of an unhealthy service
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return True
+
+
+# One breaker per service, an outage seen by any method fast-fails all of them
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(service: str) -> CircuitBreaker:
+    if service not in _breakers:
+        _breakers[service] = CircuitBreaker(
+            service,
+            failure_threshold=breaker_setting(service, "FAILURE_THRESHOLD", 5),
+            recovery_timeout=breaker_setting(service, "RECOVERY_TIMEOUT", 10),
+            half_open_max_calls=breaker_setting(service, "HALF_OPEN_MAX_CALLS", 1),
+            slow_call_duration=breaker_setting(service, "SLOW_CALL_SECONDS", 3.0, float),
+            is_failure=is_service_failure,
+        )
+    return _breakers[service]
 
 
 def wrap_cb(service):
 
-    def wrap_cb(fn):
-        cb = CircuitBreaker(service, failure_threshold=1, recovery_timeout=1)
+    def _decorator(fn):
+        cb = get_breaker(service)
 
         @wraps(fn)
-        def wrapper(*args, **kwargs):
-            return cb.call(fn, *args, **kwargs)
+        async def wrapper(*args, **kwargs):
+            return await cb.call_async(fn, *args, **kwargs)
 
         return wrapper
 
-    return wrap_cb
+    return _decorator
+
+
+def record_cache_status(hit: bool):
+    statuses = cache_statuses.get()
+    if statuses is not None:
+        statuses.append("HIT" if hit else "MISS")
+
+
+# Tells a cache miss apart from a cached value
+_MISSING = object()
+
+
+def async_cached(cache):
+
+    def _decorator(fn):
+        # Key -> the fetch in flight; concurrent misses of the same key
+        # await it and share its result or its error. A fetch loads one
+        # or more keys and resolves to a dict of the values it found
+        in_flight = {}
+
+        async def fetch(keys, load):
+            task = asyncio.current_task()
+            try:
+                values = await load()
+                for key, value in values.items():
+                    # Missing entities are not cached, neither is a value read
+                    # before an invalidation that detached this fetch
+                    if value is not None and in_flight.get(key) is task:
+                        cache[key] = value
+                return values
+            finally:
+                for key in keys:
+                    if in_flight.get(key) is task:
+                        del in_flight[key]
+
+        def start_fetch(keys, load):
+            task = asyncio.ensure_future(fetch(keys, load))
+            for key in keys:
+                in_flight[key] = task
+            return task
+
+        @wraps(fn)
+        async def wrapper(self, key):
+            # A single lookup, a TTL entry may expire between two
+            value = cache.get(key, _MISSING)
+            record_cache_status(value is not _MISSING)
+            if value is not _MISSING:
+                return value
+
+            task = in_flight.get(key)
+            if task is None:
+                async def load():
+                    return {key: await fn(self, key)}
+
+                task = start_fetch([key], load)
+            # A cancelled caller leaves the shared fetch running for the others
+            values = await asyncio.shield(task)
+            return values.get(key)
+
+        async def get_many(self, keys, fetch_many):
+            # Misses that are not in flight yet are loaded with a single
+            # fetch_many(self, keys) call returning a dict of the found values
+            keys = list(dict.fromkeys(keys))
+            values = {}
+            for key in keys:
+                value = cache.get(key, _MISSING)
+                if value is not _MISSING:
+                    values[key] = value
+            missing = [key for key in keys if key not in values]
+            record_cache_status(not missing)
+
+            tasks = {in_flight[key] for key in missing if key in in_flight}
+            to_load = [key for key in missing if key not in in_flight]
+            if to_load:
+                tasks.add(start_fetch(to_load, lambda: fetch_many(self, to_load)))
+
+            for fetched in await asyncio.gather(*(asyncio.shield(task) for task in tasks)):
+                values.update((key, value) for key, value in fetched.items() if key in missing)
+            return values
+
+        def store(key, value):
+            # A value known to be current, e.g. returned by a write; fetches
+            # in flight may have read an older one and are not stored
+            cache[key] = value
+            in_flight.pop(key, None)
+
+        def invalidate(key):
+            cache.pop(key, None)
+            # Later misses start a new fetch, the one in flight may have
+            # read the old value and is not stored
+            in_flight.pop(key, None)
+
+        def clear():
+            cache.clear()
+            in_flight.clear()
+
+        wrapper.cache = cache
+        wrapper.get_many = get_many
+        wrapper.store = store
+        wrapper.invalidate = invalidate
+        wrapper.clear = clear
+        return wrapper
+
+    return _decorator
+
+
+# Request bodies are serialized to JSON bytes up front
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+def request_cache(fn):
+    # Repeated reads with the same arguments within one request reuse the first result
+    @wraps(fn)
+    async def wrapper(self, *args, **kwargs):
+        memo = request_memo.get()
+        if memo is None:
+            return await fn(self, *args, **kwargs)
+
+        key = (type(self).__name__, fn.__name__, args, tuple(sorted(kwargs.items())))
+        if key in memo:
+            # Counts as a hit of the cache behind the call, if there is one
+            if hasattr(fn, "cache"):
+                record_cache_status(True)
+            return memo[key]
+
+        memo[key] = await fn(self, *args, **kwargs)
+        return memo[key]
+
+    return wrapper
+
+
+def invalidates_request_cache(fn):
+    # Writes make every read of the current request stale
+    @wraps(fn)
+    async def wrapper(*args, **kwargs):
+        memo = request_memo.get()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            if memo is not None:
+                memo.clear()
+
+    return wrapper
+
+
+# Shared by all service clients, connecting to a service should never take long.
+# A call waiting for a free connection of a saturated service fails fast as well
+DEFAULT_TIMEOUT = httpx.Timeout(5.0, connect=1.0, pool=1.0)
+
+# Each service gets its own pool of this size, a slow service
+# can only tie up its own connections (bulkhead)
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 10
 
 
+def create_http_client(base_url: str) -> httpx.AsyncClient:
+    # Long-lived per-service client, connections are kept alive between calls
+    return httpx.AsyncClient(
+        base_url=base_url,
+        headers={"Accept-Encoding": "gzip"},
+        timeout=DEFAULT_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=DEFAULT_MAX_CONNECTIONS,
+            max_keepalive_connections=DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+    )
+
 
 # ==============================================
 # FLIGHTS SERVICE CLIENT
@@ -26,37 +238,77 @@ def wrap_cb(service):
 class FlightsService:
     NAME = "Flights Service"
 
+    # Flights are reference data, a copy up to a minute old is fine to serve
+    _flight_cache = TTLCache(maxsize=1024, ttl=60)
+
     def __init__(self, base_url):
         self.base_url = base_url
+        self._client = create_http_client(base_url)
+
+    async def close(self):
+        await self._client.aclose()
+
+    def clear_cache(self):
+        self.get_flight_by_number.clear()
 
-    def health_check(self):
-        response = requests.get(f"{self.base_url}/manage/health")
+    async def health_check(self):
+        response = await self._client.get("/manage/health")
         response.raise_for_status()
 
     @wrap_cb(NAME)
-    def get_all_flights(self, page: int = None, size: int = None):
-        query_params = {"page": page, "size": size}
-        response = requests.get(f"{self.base_url}/flights", params=query_params)
+    async def get_all_flights(self, page: int = None, size: int = None):
+        query_params = {
+            key: value
+            for key, value in {"page": page, "size": size}.items()
+            if value is not None
+        }
+        response = await self._client.get("/flights", params=query_params)
         response.raise_for_status()
-        return PaginationResponse.model_validate(response.json())
+        return PaginationResponse.model_validate(orjson.loads(response.content))
 
+    @request_cache
+    @async_cached(_flight_cache)
     @wrap_cb(NAME)
-    def get_flight_by_number(self, flight_number: str) -> FlightResponse:
-        response = requests.get(f"{self.base_url}/flights/{flight_number}")
+    async def get_flight_by_number(self, flight_number: str) -> FlightResponse | None:
+        response = await self._client.get(f"/flights/{flight_number}")
+        if response.status_code == 404:
+            return None
         response.raise_for_status()
-        return FlightResponse.model_validate(response.json())
+        return FlightResponse.model_validate(orjson.loads(response.content))
+
+    async def get_flights_by_numbers(self, flight_numbers: list[str]) -> dict[str, FlightResponse]:
+        # Every flight is requested once, however many tickets refer to it;
+        # the ones not cached or in flight go out in a single batch request
+        return await self.get_flight_by_number.get_many(
+            self, flight_numbers, FlightsService._fetch_flights_by_numbers
+        )
 
-    def get_flight_by_number_or_default(self, flight_number: str) -> FlightResponse:
+    @wrap_cb(NAME)
+    async def _fetch_flights_by_numbers(self, flight_numbers: list[str]) -> dict[str, FlightResponse]:
+        response = await self._client.post(
+            "/flights/batch",
+            content=orjson.dumps(flight_numbers),
+            headers=JSON_HEADERS,
+        )
+        response.raise_for_status()
+        flights = _FLIGHT_LIST.validate_python(orjson.loads(response.content))
+        return {flight.flightNumber: flight for flight in flights}
+
+    @staticmethod
+    def default_flight() -> FlightResponse:
+        return FlightResponse(
+            flightNumber="XXX",
+            fromAirport="XXX",
+            toAirport="XXX",
+            date=datetime.fromordinal(1),
+            price=0,
+        )
+
+    async def get_flight_by_number_or_default(self, flight_number: str) -> FlightResponse:
         try:
-            return self.get_flight_by_number(flight_number)
+            return await self.get_flight_by_number(flight_number)
         except CircuitOpenException:
-            return FlightResponse(
-                flightNumber="XXX",
-                fromAirport="XXX",
-                toAirport="XXX",
-                date=datetime.fromordinal(1),
-                price=0,
-            )
+            return self.default_flight()
 
 
 # ==============================================
@@ -68,39 +320,48 @@ class TicketsService:
 
     def __init__(self, base_url):
         self.base_url = base_url
+        self._client = create_http_client(base_url)
 
-    def health_check(self):
-        response = requests.get(f"{self.base_url}/manage/health")
+    async def close(self):
+        await self._client.aclose()
+
+    async def health_check(self):
+        response = await self._client.get("/manage/health")
         response.raise_for_status()
 
+    @request_cache
     @wrap_cb(NAME)
-    def get_user_tickets(self, username: str) -> list[Ticket]:
-        response = requests.get(f"{self.base_url}/tickets/user/{username}")
+    async def get_user_tickets(self, username: str) -> list[Ticket]:
+        response = await self._client.get(f"/tickets/user/{username}")
         response.raise_for_status()
-        return [Ticket.model_validate(item) for item in response.json()]
+        return _TICKET_LIST.validate_python(orjson.loads(response.content))
 
+    @request_cache
     @wrap_cb(NAME)
-    def get_ticket_by_uid(self, ticket_uid: uuid.UUID) -> Ticket | None:
-        response = requests.get(f"{self.base_url}/tickets/{ticket_uid}")
+    async def get_ticket_by_uid(self, ticket_uid: uuid.UUID) -> Ticket | None:
+        response = await self._client.get(f"/tickets/{ticket_uid}")
         if response.status_code == 404:
             return None
         response.raise_for_status()
-        return Ticket.model_validate(response.json())
+        return Ticket.model_validate(orjson.loads(response.content))
 
-    def remove_ticket(self, ticket_uid: uuid.UUID) -> None:
-        response = requests.delete(f"{self.base_url}/tickets/{ticket_uid}")
+    @invalidates_request_cache
+    async def remove_ticket(self, ticket_uid: uuid.UUID) -> None:
+        response = await self._client.delete(f"/tickets/{ticket_uid}")
         response.raise_for_status()
 
-    def create_new_ticket(self, ticket_uid: uuid.UUID, username: str, flight_number: str, price: int):
+    @invalidates_request_cache
+    async def create_new_ticket(self, ticket_uid: uuid.UUID, username: str, flight_number: str, price: int):
         ticket_data = TicketCreateRequest(
             ticketUid=ticket_uid,
             username=username,
             flightNumber=flight_number,
             price=price,
         )
-        response = requests.post(
-            f"{self.base_url}/tickets",
-            json=ticket_data.model_dump(mode="json")
+        response = await self._client.post(
+            "/tickets",
+            content=ticket_data.model_dump_json().encode(),
+            headers=JSON_HEADERS,
         )
         response.raise_for_status()
 
@@ -112,44 +373,75 @@ class TicketsService:
 class PrivilegesService:
     NAME = "Bonus Service"
 
+    # Entries are dropped whenever the balance is changed through this client
+    _privilege_cache = TTLCache(maxsize=10_000, ttl=30)
+
     def __init__(self, base_url):
         self.base_url = base_url
+        self._client = create_http_client(base_url)
 
-    def health_check(self):
-        response = requests.get(f"{self.base_url}/manage/health")
+    async def close(self):
+        await self._client.aclose()
+
+    async def health_check(self):
+        response = await self._client.get("/manage/health")
         response.raise_for_status()
 
+    @request_cache
+    @async_cached(_privilege_cache)
     @wrap_cb(NAME)
-    def get_user_privilege(self, username: str) -> Privilege | None:
-        response = requests.get(f"{self.base_url}/privilege/{username}")
+    async def get_user_privilege(self, username: str) -> Privilege | None:
+        response = await self._client.get(f"/privilege/{username}")
         if response.status_code == 404:
             return None
         response.raise_for_status()
-        return Privilege.model_validate(response.json())
+        return Privilege.model_validate(orjson.loads(response.content))
 
+    @request_cache
     @wrap_cb(NAME)
-    def get_user_privilege_history(self, username: str) -> list[PrivilegeHistory]:
-        response = requests.get(f"{self.base_url}/privilege/{username}/history")
+    async def get_user_privilege_history(self, username: str) -> list[PrivilegeHistory]:
+        response = await self._client.get(f"/privilege/{username}/history")
+        if response.status_code == 404:
+            return []
         response.raise_for_status()
-        return [PrivilegeHistory.model_validate(item) for item in response.json()]
+        return _HISTORY_LIST.validate_python(orjson.loads(response.content))
 
+    @request_cache
     @wrap_cb(NAME)
-    def get_user_privilege_transaction(self, username: str, ticket_uid: uuid.UUID) -> PrivilegeHistory | None:
-        response = requests.get(f"{self.base_url}/privilege/{username}/history/{ticket_uid}")
+    async def get_user_privilege_transaction(self, username: str, ticket_uid: uuid.UUID) -> PrivilegeHistory | None:
+        response = await self._client.get(f"/privilege/{username}/history/{ticket_uid}")
         if response.status_code == 404:
             return None
         response.raise_for_status()
-        return PrivilegeHistory.model_validate(response.json())
+        return PrivilegeHistory.model_validate(orjson.loads(response.content))
 
-    def add_privilege_transaction(self, username: str, transaction_data: AddTransactionRequest):
-        response = requests.post(
-            f"{self.base_url}/privilege/{username}/history",
-            json=transaction_data.model_dump(mode="json")
-        )
+    @invalidates_request_cache
+    async def add_privilege_transaction(self, username: str, transaction_data: AddTransactionRequest) -> Privilege:
+        try:
+            response = await self._client.post(
+                f"/privilege/{username}/history",
+                content=transaction_data.model_dump_json().encode(),
+                headers=JSON_HEADERS,
+            )
+        finally:
+            # The balance may have changed even if the response got lost
+            self.get_user_privilege.invalidate(username)
         response.raise_for_status()
 
-    def revert_transaction(self, username: str, ticket_uid: uuid.UUID):
-        response = requests.delete(
-            f"{self.base_url}/privilege/{username}/history/{ticket_uid}"
-        )
-        response.raise_for_status()
\ No newline at end of file
+        updated_privilege = Privilege.model_validate(orjson.loads(response.content))
+        self.get_user_privilege.store(username, updated_privilege)
+        return updated_privilege
+
+    @invalidates_request_cache
+    @wrap_cb(NAME)
+    async def revert_transaction(self, username: str, ticket_uid: uuid.UUID):
+        try:
+            response = await self._client.delete(
+                f"/privilege/{username}/history/{ticket_uid}"
+            )
+        finally:
+            self.get_user_privilege.invalidate(username)
+        response.raise_for_status()
+
+    def clear_cache(self):
+        self.get_user_privilege.clear()
\ No newline at end of file
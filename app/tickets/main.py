@@ -1,9 +1,12 @@
 import uuid
-from fastapi import FastAPI, HTTPException, Depends, Path
+from fastapi import FastAPI, HTTPException, Depends, Path, Response
+from fastapi.middleware.gzip import GZipMiddleware
 from sqlalchemy import create_engine, Column, Integer, String, UUID
 from sqlalchemy.orm import sessionmaker, Session, declarative_base
-from sqlalchemy import Column, Integer, String, StaticPool
+from sqlalchemy import Column, Integer, String, StaticPool, select, delete, bindparam
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import declarative_base
+from pydantic import TypeAdapter
 import os
 import sys
 import inspect
@@ -30,8 +33,14 @@ if not os.getenv("TESTING"):
 
     DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-    # Database engine setup
-    engine = create_engine(DATABASE_URL)
+    # Database engine setup, the pool is sized for bursts of concurrent requests
+    engine = create_engine(
+        DATABASE_URL,
+        pool_size=20,
+        max_overflow=40,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+    )
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     Base = declarative_base()
 else:
@@ -48,6 +57,7 @@ else:
 # FASTAPI APPLICATION
 # ==============================================
 app = FastAPI(title="Tickets API")
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
 
 
 # ==============================================
@@ -68,33 +78,49 @@ class TicketDb(Base):
     __tablename__ = "ticket"
 
     id = Column(Integer, primary_key=True)
-    ticket_uid = Column(UUID(as_uuid=True), nullable=False)
-    username = Column(String(80), nullable=False)
+    ticket_uid = Column(UUID(as_uuid=True), nullable=False, unique=True, index=True)
+    username = Column(String(80), nullable=False, index=True)
     flight_number = Column(String(20), nullable=False)
     price = Column(Integer, nullable=False)
     status = Column(String(20), nullable=False)
 
 
+_TICKET_LIST = TypeAdapter(List[Ticket])
+
+# Lookups by ticket UUID are built once and reused with a bound value
+TICKET_BY_UID = select(TicketDb).where(TicketDb.ticket_uid == bindparam("ticket_uid"))
+DELETE_TICKET_BY_UID = delete(TicketDb).where(TicketDb.ticket_uid == bindparam("ticket_uid"))
+
+
 # ==============================================
 # API ENDPOINTS
 # ==============================================
-@app.get("/tickets/user/{username}", response_model=List[Ticket])
+@app.get(
+    "/tickets/user/{username}",
+    response_model=None,
+    responses={200: {"model": List[Ticket]}},
+)
 def get_user_tickets(username: str, db: Session = Depends(get_db)):
-    user_tickets = (
-        db.query(TicketDb)
-        .filter(TicketDb.username == username)
-        .all()
-    )
-    return user_tickets
+    # Plain column rows, no ORM instances are built for the list
+    ticket_rows = db.execute(
+        select(
+            TicketDb.id,
+            TicketDb.ticket_uid,
+            TicketDb.username,
+            TicketDb.flight_number,
+            TicketDb.price,
+            TicketDb.status,
+        ).where(TicketDb.username == username)
+    ).all()
+
+    # Validated and serialized by pydantic-core straight to JSON bytes
+    user_tickets = _TICKET_LIST.validate_python(ticket_rows, from_attributes=True)
+    return Response(content=_TICKET_LIST.dump_json(user_tickets), media_type="application/json")
 
 
 @app.get("/tickets/{ticket_uid}", response_model=Ticket)
 def get_ticket_details(ticket_uid: uuid.UUID, db: Session = Depends(get_db)):
-    ticket_record = (
-        db.query(TicketDb)
-        .filter(TicketDb.ticket_uid == ticket_uid)
-        .first()
-    )
+    ticket_record = db.scalars(TICKET_BY_UID, {"ticket_uid": ticket_uid}).first()
 
     if not ticket_record:
         raise HTTPException(
@@ -107,20 +133,7 @@ def get_ticket_details(ticket_uid: uuid.UUID, db: Session = Depends(get_db)):
 
 @app.post("/tickets", status_code=201)
 def create_new_ticket(request: TicketCreateRequest, db: Session = Depends(get_db)):
-    # Check for existing ticket with same UUID
-    existing_ticket = (
-        db.query(TicketDb)
-        .filter(TicketDb.ticket_uid == request.ticketUid)
-        .first()
-    )
-
-    if existing_ticket:
-        raise HTTPException(
-            status_code=403,
-            detail="Ticket with this UUID already exists"
-        )
-
-    # Create new ticket
+    # Create new ticket, a duplicate UUID is rejected by the unique constraint
     ticket_entry = TicketDb(
         ticket_uid=request.ticketUid,
         username=request.username,
@@ -130,24 +143,27 @@ def create_new_ticket(request: TicketCreateRequest, db: Session = Depends(get_db
     )
 
     db.add(ticket_entry)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=403,
+            detail="Ticket with this UUID already exists"
+        )
 
 
 @app.delete("/tickets/{ticket_uid}", status_code=204)
 def remove_ticket(ticket_uid: uuid.UUID, db: Session = Depends(get_db)):
-    ticket_record = (
-        db.query(TicketDb)
-        .filter(TicketDb.ticket_uid == ticket_uid)
-        .first()
-    )
+    # Single DELETE, the affected row count tells whether the ticket existed
+    deleted = db.execute(DELETE_TICKET_BY_UID, {"ticket_uid": ticket_uid}).rowcount
 
-    if not ticket_record:
+    if not deleted:
         raise HTTPException(
             status_code=404,
             detail="Ticket not found"
         )
 
-    db.delete(ticket_record)
     db.commit()
 
 
@@ -1,61 +1,18 @@
 from datetime import datetime
 from uuid import uuid4
 import pytest
-from fastapi.testclient import TestClient
-from sqlalchemy.orm import sessionmaker
-import os
+from main import TicketDb
 
 # ==============================================
-# TEST CONFIGURATION
-# ==============================================
-os.environ["TESTING"] = "True"
-
-from main import app, get_db, Base, TicketDb, engine
-
-# ==============================================
-# DATABASE SETUP FOR TESTING
+# TEST FIXTURES
 # ==============================================
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
+# Database fixtures and the client come from testing/db_plugin.py,
+# loaded by the root conftest.py
 
-def override_get_db():
-    try:
-        db_session = TestingSessionLocal()
-        yield db_session
-    finally:
-        db_session.close()
 
-
-app.dependency_overrides[get_db] = override_get_db
-
-
-# ==============================================
-# TEST FIXTURES
-# ==============================================
-@pytest.fixture(scope="function")
-def db_session():
-    """
-    Creates a fresh database session for test execution
-    """
-    Base.metadata.create_all(bind=engine)
-
-    test_session = TestingSessionLocal()
-    try:
-        yield test_session
-    finally:
-        test_session.close()
-        Base.metadata.drop_all(bind=engine)
-
-
-@pytest.fixture
-def client():
-    Base.metadata.create_all(bind=engine)
-    yield TestClient(app)
-    Base.metadata.drop_all(bind=engine)
-
-
-@pytest.fixture
-def sample_ticket(db_session):
+@pytest.fixture(scope="session")
+def sample_ticket(session_factory):
+    db_session = session_factory(expire_on_commit=False)
     ticket_record = TicketDb(
         ticket_uid=uuid4(),
         username="test_user",
@@ -65,6 +22,7 @@ def sample_ticket(db_session):
     )
     db_session.add(ticket_record)
     db_session.commit()
+    db_session.close()
 
     return ticket_record
 
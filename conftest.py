@@ -0,0 +1,9 @@
+import os
+
+# ==============================================
+# TEST CONFIGURATION
+# ==============================================
+os.environ["TESTING"] = "True"
+
+# Shared fixtures of the service test suites, see testing/db_plugin.py
+pytest_plugins = ("testing.db_plugin",)
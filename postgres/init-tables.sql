@@ -12,6 +12,8 @@ CREATE TABLE ticket
         CHECK (status IN ('PAID', 'CANCELED'))
 );
 
+CREATE INDEX ix_ticket_username ON ticket (username);
+
 \c flights
 set role program;
 
@@ -26,13 +28,15 @@ CREATE TABLE airport
 CREATE TABLE flight
 (
     id              SERIAL PRIMARY KEY,
-    flight_number   VARCHAR(20)              NOT NULL,
+    flight_number   VARCHAR(20)              NOT NULL UNIQUE,
     datetime        TIMESTAMP WITH TIME ZONE NOT NULL,
     from_airport_id INT REFERENCES airport (id),
     to_airport_id   INT REFERENCES airport (id),
     price           INT                      NOT NULL
 );
 
+CREATE INDEX ix_flight_dt_id ON flight (datetime, id);
+
 \c privileges
 set role program;
 
@@ -55,3 +59,6 @@ CREATE TABLE privilege_history
     operation_type VARCHAR(20) NOT NULL
         CHECK (operation_type IN ('FILL_IN_BALANCE', 'DEBIT_THE_ACCOUNT'))
 );
+
+CREATE INDEX ix_privilege_history_privilege_id_ticket_uid
+    ON privilege_history (privilege_id, ticket_uid);
@@ -0,0 +1,140 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import ForeignKeyConstraint, MetaData, event
+from sqlalchemy.orm import sessionmaker
+
+
+# ==============================================
+# DATABASE SETUP FOR TESTING
+# ==============================================
+def metadata_without_fks(metadata):
+    """
+    Clones the metadata without foreign key constraints,
+    which are the most expensive part of the test schema DDL
+    """
+    metadata_copy = MetaData()
+    for table in metadata.sorted_tables:
+        table_copy = table.to_metadata(metadata_copy)
+        for constraint in list(table_copy.constraints):
+            if isinstance(constraint, ForeignKeyConstraint):
+                table_copy.constraints.discard(constraint)
+        for column in table_copy.columns:
+            column.foreign_keys.clear()
+    return metadata_copy
+
+
+# ==============================================
+# TEST FIXTURES
+# ==============================================
+# The root conftest.py loads this plugin, the conftest.py of every service
+# provides the `service` fixture: its main module with app and, for services
+# with a database, get_db, Base and engine
+
+
+def has_database(service):
+    # The gateway keeps no data of its own
+    return getattr(service, "engine", None) is not None
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _schema(service):
+    """
+    Creates the database schema once for the whole test session,
+    emitting all DDL in a single transaction
+    """
+    if not has_database(service):
+        yield
+        return
+
+    engine = service.engine
+
+    # pysqlite manages BEGIN on its own and breaks SAVEPOINT nesting,
+    # so let SQLAlchemy emit it instead
+    @event.listens_for(engine, "connect")
+    def _disable_pysqlite_begin(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _emit_begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+    with engine.begin() as connection:
+        metadata_without_fks(service.Base.metadata).create_all(bind=connection)
+    yield
+    # In-memory database is discarded together with its connection
+    engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def connection(service, _schema):
+    """
+    Holds a single connection with an outer transaction for the whole
+    session; it is rolled back at the end, so nothing is ever committed
+    """
+    connection = service.engine.connect()
+    transaction = connection.begin()
+    try:
+        yield connection
+    finally:
+        transaction.rollback()
+        connection.close()
+
+
+@pytest.fixture(scope="session")
+def session_factory(service, connection):
+    """
+    Session factory bound to the test connection; the app's sessions
+    come from it too, so a commit only releases a SAVEPOINT
+    """
+    TestingSessionLocal = sessionmaker(
+        bind=connection,
+        autocommit=False,
+        autoflush=False,
+        join_transaction_mode="create_savepoint",
+    )
+
+    def override_get_db():
+        db_session = TestingSessionLocal()
+        try:
+            yield db_session
+        finally:
+            db_session.close()
+
+    service.app.dependency_overrides[service.get_db] = override_get_db
+    yield TestingSessionLocal
+    service.app.dependency_overrides.pop(service.get_db, None)
+
+
+@pytest.fixture(scope="function", autouse=True)
+def _savepoint(service, request):
+    """
+    Runs every test inside a SAVEPOINT that is rolled back afterwards;
+    sessions (including the app's) commit to nested SAVEPOINTs only
+    """
+    if not has_database(service):
+        yield
+        return
+
+    connection = request.getfixturevalue("connection")
+    # Routes the app's sessions to the test connection
+    request.getfixturevalue("session_factory")
+    savepoint = connection.begin_nested()
+    try:
+        yield
+    finally:
+        savepoint.rollback()
+
+
+@pytest.fixture(scope="function")
+def db_session(_savepoint, session_factory):
+    test_session = session_factory()
+    try:
+        yield test_session
+    finally:
+        test_session.close()
+
+
+@pytest.fixture(scope="session")
+def client(service):
+    with TestClient(service.app) as test_client:
+        yield test_client